@@ -1,14 +1,27 @@
+import atexit
 import click
-import configparser
+import functools
 import os
 import hmac
 import hashlib
+import sys
 
-from flask import Flask, render_template, request
-from committee.web.web_helper import internal_error, get_main
-from committee.parsers.rule_parser import resolve_config
-from committee.common_errors import err_config_load
-from committee.git_comm import start_session
+from collections import Counter
+from requests.adapters import DEFAULT_POOLSIZE
+from flask import Flask, request, jsonify
+from committee.web.web_helper import internal_error, get_main, Dashboard
+from committee.web.web_helper import get_wordlist
+from committee.web.wordlist_index import WordlistIndexes
+from committee.web.job_pool import JobPool
+from committee.storage.job_queue import JobQueue
+from committee.parsers.config_loader import read_config, compile_rules
+from committee.parsers.config_loader import ConfigCache, load_config
+from committee.git_comm import start_session, payload_commits
+from committee.git_session import SharedAdapter
+from committee.git_ratelimit import RateLimiter
+from committee.git_repos import read_repos_file, org_repos, check_repos
+from committee.git_repos import summary_line, SUMMARY_KEYS
+from committee.common_output import echo, replay
 
 
 # Loads config (+ token and committee context)
@@ -17,7 +30,10 @@ from committee.git_comm import start_session
 # Sorts rules according to their names
 # Starts validation session
 def run_app(config, author, path, ref, force, output_format,
-            dry_run, reposlug, from_request=''):
+            dry_run, reposlug, from_request='', jobs=1, use_async=False,
+            cache_dir=None, cache_size=256, incremental=False,
+            target_url='', loaded_config=None, adapter=None, backend='rest',
+            repo_path=None, backfill=False, shard_pages=10):
     """
     Main entry point of the CLI application.
 
@@ -25,32 +41,133 @@ def run_app(config, author, path, ref, force, output_format,
 
     After, rules are created and sorted by name.
 
-    Once all done, validation session is started.    
+    Once all done, validation session is started (commits are checked 
+    by given number of worker threads or by asyncio pipeline with 
+    the same number of commits in flight, commit details are cached 
+    in the cache directory if set).    
+
+    In incremental mode, only commits newer than the previous run 
+    are checked (the state is kept in the cache directory).
+
+    Commits from webhook request are all checked concurrently, 
+    their statuses link to the target url.
+
+    With GraphQL backend, commit history with stats and statuses is read 
+    in bulk, commit details are fetched only for rules checking files.
+    With repository path, commits are read from the local clone and 
+    Github is used only for statuses.
+
+    Backfill splits the history into shards of pages kept in the cache
+    directory, shards can be checked by more processes at once and
+    an interrupted backfill continues where it stopped.
+
+    The server passes already loaded config (with compiled rules),
+    then the config file is not read again, and its shared connection pool.
+
+    Returns the summary of checked commits and written statuses.
     """
-    config_parser = configparser.ConfigParser(allow_no_value=True)
-    with open(config) as f:
-        try:
-            config_parser.read_file(f)
-        except configparser.MissingSectionHeaderError:
-            err_config_load()
-    try:
-        git_token = config_parser.get('github', 'token')
-        com_context = config_parser.get('committee', 'context')
-    except configparser.NoOptionError:
-        err_config_load()
-    except configparser.NoSectionError:
-        err_config_load()
+    if loaded_config is None:
+        config_parser, git_token, com_context = read_config(config)
+    else:
+        git_token = loaded_config.git_token
+        com_context = loaded_config.com_context
+    if incremental and not cache_dir:
+        raise click.BadParameter('Incremental mode needs the cache directory!',
+                                 param_hint='\'--cache-dir\'')
+    if backfill and (not cache_dir or incremental or use_async or
+                     backend != 'rest' or repo_path is not None):
+        raise click.BadParameter('Backfill needs the cache directory and '
+                                 'runs only by itself with rest backend!',
+                                 param_hint='\'--backfill\'')
+    if repo_path is not None:
+        if backend != 'rest':
+            raise click.BadParameter('Local repository cannot be read by '
+                                     f'{backend} backend!',
+                                     param_hint='\'--repo-path\'')
+        backend = 'local'
     try:
         owner, repo = reposlug.split('/')
     except ValueError:
         raise click.BadParameter(f'Reposlug "{reposlug}" is not valid!',
                                  param_hint='\'REPOSLUG\'')
-    rule_set = []
-    resolve_config(config_parser, config, rule_set)
-    rule_set.sort(key=lambda rule: rule.rule_name)
-    start_session(git_token, com_context, owner, repo, author, path, ref,
-                  rule_set, config, force, output_format, dry_run,
-                  from_request)
+    if loaded_config is None:
+        rule_set = compile_rules(config_parser, config)
+    else:
+        rule_set = loaded_config.rule_set
+    return start_session(git_token, com_context, owner, repo, author, path,
+                         ref, rule_set, config, force, output_format,
+                         dry_run, from_request, jobs, use_async, cache_dir,
+                         cache_size, incremental, target_url, adapter,
+                         backend, repo_path, backfill, shard_pages)
+
+
+def run_repos(config, author, path, ref, force, output_format, dry_run,
+              reposlugs, repos_file=None, org=None, repo_jobs=4, jobs=1,
+              use_async=False, cache_dir=None, cache_size=256,
+              incremental=False, backend='rest', repo_path=None,
+              backfill=False, shard_pages=10):
+    """
+    Checks multiple repositories (given reposlugs, reposlugs from file
+    and repositories of the organization) in one run.
+
+    The config is loaded and rules are compiled only once, all sessions
+    share one connection pool. Up to repo_jobs repositories are checked
+    at the same time, each of them by jobs workers (so one big repository
+    does not take all the connections).
+
+    Output of the repositories is printed in order, followed by
+    the summary of all repositories.
+    """
+    if repo_path is not None:
+        raise click.BadParameter('Local repository can be used only with '
+                                 'a single repository!',
+                                 param_hint='\'--repo-path\'')
+    loaded_config = load_config(config)
+    reposlugs = list(reposlugs)
+    if repos_file:
+        reposlugs.extend(read_repos_file(repos_file))
+    adapter = SharedAdapter(repo_jobs * max(jobs, DEFAULT_POOLSIZE))
+    try:
+        if org:
+            reposlugs.extend(org_repos(loaded_config.git_token, org,
+                                       adapter))
+        reposlugs = list(dict.fromkeys(reposlugs))
+        if not reposlugs:
+            raise click.BadParameter('No repositories to check!',
+                                     param_hint='\'REPOSLUG\'')
+        runner = functools.partial(
+            run_app, config, author, path, ref, force, output_format,
+            dry_run, jobs=jobs, use_async=use_async, cache_dir=cache_dir,
+            cache_size=cache_size, incremental=incremental,
+            loaded_config=loaded_config, adapter=adapter, backend=backend,
+            backfill=backfill, shard_pages=shard_pages)
+        totals = Counter()
+        lines = []
+        failed = 0
+        for reposlug, summary, error, output in check_repos(
+                runner, reposlugs, repo_jobs):
+            if output_format != 'none':
+                echo(click.style(f'# {reposlug}', bold=True))
+            replay(output)
+            if error is not None:
+                failed += 1
+                lines.append(f'  {reposlug}: '
+                             f'{click.style("ERROR", fg="magenta")} - '
+                             f'{error}')
+                continue
+            totals.update(summary)
+            lines.append(f'  {reposlug}: {summary_line(summary)}')
+    finally:
+        adapter.shutdown()
+    if output_format != 'none':
+        echo(click.style(f'Summary of {len(reposlugs)} repositories:',
+                         bold=True))
+        for line in lines:
+            echo(line)
+        total = summary_line({key: totals[key] for key in SUMMARY_KEYS})
+        echo(f'Total: {total}, {failed} repositories failed')
+    if failed:
+        raise SystemExit(1)
 
 
 @click.command()
@@ -70,15 +187,67 @@ def run_app(config, author, path, ref, force, output_format,
               ' output.', show_default=True)
 @click.option('-d', '--dry-run', is_flag=True, help='No changes will be made'
               ' on GitHub.')
-@click.argument('reposlug', nargs=1, required=True)
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=1,
+              metavar='N', help='Number of commits checked concurrently.',
+              show_default=True)
+@click.option('--async', 'use_async', is_flag=True, help='Check commits in'
+              ' asyncio pipeline reading pages ahead, --jobs limits the'
+              ' commits in flight.')
+@click.option('--cache-dir', metavar='DIR', envvar='COMMITTEE_CACHE_DIR',
+              help='Directory for persistent cache of commit details,'
+              ' HTTP responses and incremental state.')
+@click.option('--cache-size', metavar='MB', type=click.IntRange(min=1),
+              default=256, help='Size limit of each cache.',
+              show_default=True)
+@click.option('-i', '--incremental', is_flag=True, help='Check only commits'
+              ' newer than the last run (needs --cache-dir).')
+@click.option('--backend', type=click.Choice(['rest', 'graphql']),
+              default='rest', help='Github API used to read the commit'
+              ' history.', show_default=True)
+@click.option('--repo-path', metavar='DIR', type=click.Path(exists=True,
+              file_okay=False), help='Read commits from local clone (or bare'
+              ' mirror) of the repository, Github is used only for statuses.')
+@click.option('--repos-file', metavar='FILENAME', type=click.Path(
+              exists=True, dir_okay=False), help='File with reposlugs to'
+              ' check (one per line).')
+@click.option('--org', metavar='ORG', help='Check all repositories of the'
+              ' organization (or user).')
+@click.option('--repo-jobs', type=click.IntRange(min=1), default=4,
+              metavar='N', help='Number of repositories checked concurrently'
+              ' when checking multiple repositories.', show_default=True)
+@click.option('--backfill', is_flag=True, help='Check the history in'
+              ' resumable shards (needs --cache-dir), more processes can'
+              ' check one backfill at the same time.')
+@click.option('--shard-pages', type=click.IntRange(min=1), default=10,
+              metavar='N', help='Number of pages of 100 commits in a shard'
+              ' of the backfill.', show_default=True)
+@click.argument('reposlug', nargs=-1)
 def main_app(config, author, path, ref, force, output_format,
-             dry_run, reposlug):
+             dry_run, jobs, use_async, cache_dir, cache_size, incremental,
+             backend, repo_path, repos_file, org, repo_jobs, backfill,
+             shard_pages, reposlug):
     """
     CLI click wrapper for the application.
 
     Everything is forwarded into the main entry point.
     """
-    run_app(config, author, path, ref, force, output_format, dry_run, reposlug)
+    if len(reposlug) == 1 and not repos_file and not org:
+        run_app(config, author, path, ref, force, output_format, dry_run,
+                reposlug[0], jobs=jobs, use_async=use_async,
+                cache_dir=cache_dir, cache_size=cache_size,
+                incremental=incremental, backend=backend,
+                repo_path=repo_path, backfill=backfill,
+                shard_pages=shard_pages)
+    elif not reposlug and not repos_file and not org:
+        raise click.BadParameter('Missing reposlug, repositories file or '
+                                 'organization!', param_hint='\'REPOSLUG\'')
+    else:
+        run_repos(config, author, path, ref, force, output_format, dry_run,
+                  reposlug, repos_file, org, repo_jobs, jobs=jobs,
+                  use_async=use_async, cache_dir=cache_dir,
+                  cache_size=cache_size, incremental=incremental,
+                  backend=backend, repo_path=repo_path, backfill=backfill,
+                  shard_pages=shard_pages)
 
 
 def main():
@@ -96,13 +265,48 @@ def handle_ping():
     return '', 200
 
 
-def handle_push(config_name):
+def run_job(config_cache, adapter, reposlug, config_name, target_url,
+            commits):
+    """
+    Checks commits of a queued webhook job (called by the job pool).
+
+    Commits are checked concurrently (COMMITTEE_JOBS workers, 8 by default).
+    """
+    loaded_config = config_cache.get(config_name)
+    run_app(config_name, '', '', '', False, 'none', False, reposlug,
+            {'commits': commits},
+            jobs=int(os.environ.get('COMMITTEE_JOBS', 8)),
+            cache_dir=os.environ.get('COMMITTEE_CACHE_DIR'),
+            target_url=target_url, loaded_config=loaded_config,
+            adapter=adapter)
+
+
+def open_job_queue():
+    """
+    Opens the webhook job queue, it is kept in the cache directory
+    (COMMITTEE_CACHE_DIR) so it survives restarts. Without the directory
+    the queue is kept in memory and a warning is printed.
+    """
+    cache_dir = os.environ.get('COMMITTEE_CACHE_DIR')
+    if not cache_dir:
+        print('Warning: COMMITTEE_CACHE_DIR is not set, webhook jobs are '
+              'kept in memory and lost on restart.', file=sys.stderr)
+        return JobQueue(':memory:')
+    return JobQueue(os.path.join(cache_dir, 'jobs.sqlite'))
+
+
+def handle_push(config_name, job_pool):
     """
     Helper for web app to start commit checking.
+
+    Commits of the push are queued and checked by background workers,
+    the request is acknowledged right away.
     """
-    run_app(os.path.join(os.getcwd(), config_name), '', '', '', False, 'none',
-            False, 'fitancinpet/committee-web-test', request.json)
-    return 'OK', 200
+    queued, coalesced = job_pool.submit(
+        'fitancinpet/committee-web-test',
+        os.path.join(os.getcwd(), config_name), request.base_url,
+        payload_commits(request.json))
+    return f'Queued {queued} commits ({coalesced} already queued).', 202
 
 
 def request_not_trusted(payload, com_secret, sha):
@@ -117,7 +321,7 @@ def request_not_trusted(payload, com_secret, sha):
     return 'sha1=' + signature != sha
 
 
-def post_main(com_secret, config_name):
+def post_main(com_secret, config_name, job_pool):
     """
     Handles server POST requests.
     """
@@ -128,7 +332,7 @@ def post_main(com_secret, config_name):
     if 'ping' in request.headers.get('X-Github-Event'):
         return handle_ping()
     elif 'push' in request.headers.get('X-Github-Event'):
-        return handle_push(config_name)
+        return handle_push(config_name, job_pool)
     return 'Accepted but nothing was done.', 202
 
 
@@ -138,43 +342,68 @@ def create_app(config=None):
 
     Everything is forwarded into the main entry point in case of webhook, 
     website is shown in case of GET request.
+
+    Webhook commits are queued and checked by background workers
+    (COMMITTEE_WORKERS, 2 by default), queue depth and latency
+    are shown at /queue/ together with Github API throughput and budgets.
+
+    The config and its rules are loaded once and kept in memory until
+    the config file or one of its wordlists changes.
+
+    All Github requests of the process share one keep-alive connection
+    pool (COMMITTEE_POOL_SIZE connections, 20 by default, TCP keep-alive
+    every COMMITTEE_KEEP_ALIVE seconds, 0 turns reuse off), it is closed
+    when the process exits.
+
+    The website is served from a cached render (re-rendered on config
+    change or after COMMITTEE_DASHBOARD_TTL seconds, 60 by default)
+    with ETag, the Github login is fetched in background.
     """
     app = Flask(__name__)
+    config_cache = ConfigCache()
+    wordlist_indexes = WordlistIndexes()
+    dashboard = Dashboard(int(os.environ.get('COMMITTEE_DASHBOARD_TTL', 60)))
+    adapter = SharedAdapter(int(os.environ.get('COMMITTEE_POOL_SIZE', 20)),
+                            int(os.environ.get('COMMITTEE_KEEP_ALIVE', 60)))
+    job_pool = JobPool(open_job_queue(),
+                       functools.partial(run_job, config_cache, adapter),
+                       workers=int(os.environ.get('COMMITTEE_WORKERS', 2)))
+    # Jobs left in the queue by the previous run are checked right away
+    job_pool.start()
+
+    @atexit.register
+    def shutdown():
+        job_pool.stop(timeout=10)
+        adapter.shutdown()
 
     @app.route('/', methods=['GET', 'POST'])
     def index():
         config_name = os.environ.get('COMMITTEE_CONFIG')
-        config_parser = configparser.ConfigParser(allow_no_value=True)
         try:
-            with open(config_name) as cfg:
-                try:
-                    config_parser.read_file(cfg)
-                except configparser.MissingSectionHeaderError:
-                    return internal_error('Unable to load configuration.')
-                config = config_parser._sections
-                try:
-                    git_token = config_parser.get('github', 'token')
-                    com_secret = config_parser.get('github', 'secret',
-                                                   fallback='')
-                except configparser.NoOptionError:
-                    return internal_error('Unable to load configuration.')
-                except configparser.NoSectionError:
-                    return internal_error('Unable to load configuration.')
-                config.pop('github')
-                if request.method == 'POST':
-                    return post_main(com_secret, config_name)
-                else:
-                    return get_main(config, git_token)
-        except TypeError:
+            loaded_config = config_cache.get(
+                os.path.join(os.getcwd(), config_name))
+        except (TypeError, OSError, click.BadParameter):
             return internal_error('Unable to load configuration.')
-        return 'Nothing to see here.', 204
+        if request.method == 'POST':
+            return post_main(loaded_config.com_secret, config_name,
+                             job_pool)
+        else:
+            return get_main(dashboard, loaded_config, adapter)
+
+    @app.route('/queue/')
+    def queue():
+        stats = job_pool.stats()
+        try:
+            loaded_config = config_cache.get(
+                os.path.join(os.getcwd(), os.environ.get('COMMITTEE_CONFIG')))
+        except (TypeError, OSError, click.BadParameter):
+            return jsonify(stats)
+        stats['github'] = RateLimiter.for_token(
+            loaded_config.git_token).stats()
+        return jsonify(stats)
 
     @app.route('/wordlists/<name>/')
     def wordlists(name):
-        try:
-            with open(f'../wordlists/{name}') as f:
-                return render_template('wordlists.html', lines=f.readlines())
-        except IOError:
-            return internal_error('Word list does not exist.')
+        return get_wordlist(wordlist_indexes, f'../wordlists/{name}')
 
     return app
@@ -0,0 +1,53 @@
+import click
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+captured_output = ContextVar('captured_output', default=None)
+
+
+def echo(message='', nl=True):
+    """
+    Prints the message, unless the output is being captured
+    (then it is stored and printed later by replay). The message can be
+    a function returning the text, it is called only when printed.
+    """
+    buffer = captured_output.get()
+    if buffer is None:
+        if callable(message):
+            message = message()
+        click.echo(message, nl=nl)
+    else:
+        buffer.append((message, nl))
+
+
+@contextmanager
+def capture():
+    """
+    Captures everything echoed in the current thread, used when commits
+    are checked concurrently but printed in order.
+    """
+    buffer = []
+    token = captured_output.set(buffer)
+    try:
+        yield buffer
+    finally:
+        captured_output.reset(token)
+
+
+def replay(buffer):
+    """
+    Prints the captured output.
+    """
+    for message, nl in buffer:
+        echo(message, nl=nl)
+
+
+def resolved(buffer):
+    """
+    Returns the captured output with deferred messages turned into text
+    (waits for them).
+    """
+    return [(message() if callable(message) else message, nl)
+            for message, nl in buffer]
@@ -0,0 +1,142 @@
+import asyncio
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from committee.common_output import replay, resolved
+from committee.git_comm import commit_info, load_statuses, backend_pages
+from committee.git_comm import commits_until, commits_failed
+from committee.git_comm import resolve_captured
+
+
+class AsyncGitClient:
+    """
+    Asyncio driver of the blocking Github calls.
+
+    The calls (including checking of a whole commit by resolve_commit)
+    run with the (pooled, keep-alive) Github session in a thread pool,
+    so the pipeline shares all of the checking code, authentication
+    and adapters with the rest of the application. At most max_in_flight
+    calls are in flight at the same time.
+
+    The client has to be created inside of the running event loop.
+    """
+    def __init__(self, git_session, max_in_flight=10):
+        self.git_session = git_session
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight)
+
+    async def call(self, func, *args, **kwargs):
+        """
+        Runs a blocking call once a slot is free and returns its result.
+        """
+        async with self.semaphore:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(
+                self.executor, functools.partial(func, *args, **kwargs))
+
+    async def next_page(self, pages):
+        """
+        Reads the next page of the (blocking) page generator in the thread
+        pool, returns False when there are no more pages.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, next, pages, False)
+
+    def close(self):
+        """
+        Shuts down the thread pool, the session is closed by its owner.
+        """
+        self.executor.shutdown(wait=True)
+
+
+def check_commit(*args):
+    """
+    Resolves the commit (arguments of resolve_captured), returns its
+    output once its status is written, so printing it never waits.
+    """
+    return resolved(resolve_captured(*args))
+
+
+async def pull_commits_async(client, com_context, owner, repo, author, path,
+                             ref, rule_set, config, force, output_format,
+                             dry_run, window, stop_sha=None, target_url='',
+                             backend='rest', repo_path=None):
+    """
+    Retrieves all commits from given repository (by any backend) and checks
+    them as asyncio tasks. Pages are read while commits of previous pages
+    are still being checked, at most window commits are pending.
+    Pagination stops at stop_sha, returns SHA of the newest commit.
+    """
+    git_session = client.git_session
+    pending = deque()
+    newest = None
+    pages = backend_pages(git_session, owner, repo, author, path, ref,
+                          backend, repo_path)
+    try:
+        while True:
+            commits = await client.next_page(pages)
+            if commits is False:
+                break
+            if commits is None:
+                for task in pending:
+                    replay(await task)
+                pending.clear()
+                commits_failed(owner, repo)
+            if newest is None and commits:
+                newest = commit_info(commits[0])[0]
+            commits, reached = commits_until(commits, stop_sha)
+            await client.call(load_statuses, git_session, owner, repo,
+                              commits, force)
+            for commit in commits:
+                pending.append(asyncio.ensure_future(client.call(
+                    check_commit, commit, rule_set, config, git_session,
+                    com_context, owner, repo, force, output_format, dry_run,
+                    target_url)))
+                while len(pending) >= window:
+                    replay(await pending.popleft())
+            if reached:
+                break
+        while pending:
+            replay(await pending.popleft())
+    finally:
+        for task in pending:
+            task.cancel()
+        pages.close()
+    return newest
+
+
+async def run_pipeline(git_session, com_context, owner, repo, author, path,
+                       ref, rule_set, config, force, output_format, dry_run,
+                       jobs, stop_sha=None, target_url='', backend='rest',
+                       repo_path=None):
+    """
+    Creates the async client and runs the whole commit pipeline.
+    """
+    client = AsyncGitClient(git_session, max_in_flight=jobs)
+    try:
+        return await pull_commits_async(client, com_context, owner, repo,
+                                        author, path, ref, rule_set, config,
+                                        force, output_format, dry_run,
+                                        jobs * 4, stop_sha, target_url,
+                                        backend, repo_path)
+    finally:
+        client.close()
+
+
+def pull_commits_asyncio(git_session, com_context, owner, repo, author, path,
+                         ref, rule_set, config, force, output_format, dry_run,
+                         jobs, stop_sha=None, target_url='', backend='rest',
+                         repo_path=None):
+    """
+    Runs the commit pipeline in a new asyncio event loop,
+    returns SHA of the newest commit.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(run_pipeline(
+            git_session, com_context, owner, repo, author, path, ref,
+            rule_set, config, force, output_format, dry_run, jobs, stop_sha,
+            target_url, backend, repo_path))
+    finally:
+        loop.close()
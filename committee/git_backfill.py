@@ -0,0 +1,161 @@
+import os
+import socket
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+from committee.git_comm import commits_failed, commit_info, load_statuses
+from committee.git_comm import resolve_commits, open_state_store
+from committee.storage.backfill_manifest import BackfillManifest
+
+
+def open_manifest(cache_dir):
+    """
+    Opens the backfill manifest in the cache directory.
+    """
+    return BackfillManifest(os.path.join(cache_dir, 'backfill.sqlite'))
+
+
+def history_page(git_session, owner, repo, author, path, sha, page,
+                 per_page=100):
+    """
+    Requests one page of the history of the commit.
+    """
+    return git_session.get(f'https://api.github.com/repos/{owner}/{repo}/'
+                           'commits', params={'author': author, 'path': path,
+                                              'sha': sha, 'page': page,
+                                              'per_page': per_page})
+
+
+def last_page(req):
+    """
+    Returns number of the last page from the Link header.
+    """
+    last_url = req.links.get('last', {}).get('url')
+    if last_url is None:
+        return 1 if req.json() else 0
+    return int(parse_qs(urlparse(last_url).query)['page'][0])
+
+
+def plan_backfill(git_session, manifest, com_context, owner, repo, author,
+                  path, ref, shard_pages):
+    """
+    Returns the backfill of the history, plans it if it does not exist yet
+    (the history is pinned to the current head of the ref). A finished
+    backfill is planned again when the ref moved to another head.
+    """
+    reposlug = f'{owner}/{repo}'
+    backfill = manifest.find(reposlug, ref, com_context, author, path)
+    if backfill is not None:
+        done, total = manifest.progress(backfill['id'])
+        if done < total:
+            return backfill
+    req = history_page(git_session, owner, repo, None, None, ref, 1, 1)
+    if not req.ok or not req.json():
+        commits_failed(owner, repo)
+    head_sha = commit_info(req.json()[0])[0]
+    if backfill is not None and backfill['head_sha'] == head_sha:
+        return backfill
+    req = history_page(git_session, owner, repo, author, path, head_sha, 1)
+    if not req.ok:
+        commits_failed(owner, repo)
+    newest_sha = commit_info(req.json()[0])[0] if req.json() else None
+    return manifest.plan(reposlug, ref, com_context, author, path, head_sha,
+                         newest_sha, last_page(req), shard_pages)
+
+
+def written_page(git_session, failed_before):
+    """
+    Waits for the statuses queued for the page, returns SHAs of its
+    commits whose status failed (failed_before is the number of failed
+    statuses before the page).
+    """
+    git_session.status_writer.flush()
+    return git_session.status_writer.failed_since(failed_before)
+
+
+def backfill_shard(git_session, manifest, backfill, shard, worker,
+                   lease_time, com_context, owner, repo, author, path,
+                   rule_set, config, force, output_format, dry_run,
+                   executor):
+    """
+    Checks pages of the shard from its recorded next page, the next page
+    is recorded after every page once its statuses are written (nothing
+    is recorded in DRY RUN). Like in a single run, a commit whose status
+    failed is not checked again, it is recorded as a failure of the
+    backfill instead.
+    """
+    for page in range(shard['next_page'], shard['stop_page']):
+        req = history_page(git_session, owner, repo, author, path,
+                           backfill['head_sha'], page)
+        if not req.ok:
+            commits_failed(owner, repo)
+        commits = req.json()
+        failed_before = len(git_session.status_writer.failed) \
+            if not dry_run else 0
+        load_statuses(git_session, owner, repo, commits, force)
+        resolve_commits(commits, rule_set, config, git_session, com_context,
+                        owner, repo, force, output_format, dry_run, executor)
+        if dry_run:
+            continue
+        failed = written_page(git_session, failed_before)
+        if not manifest.checkpoint(backfill['id'], shard['number'], worker,
+                                   page + 1, lease_time, failed):
+            return
+    if not dry_run:
+        manifest.finish(backfill['id'], shard['number'], worker)
+
+
+def run_backfill(git_session, com_context, owner, repo, author, path, ref,
+                 rule_set, config, force, output_format, dry_run, jobs,
+                 cache_dir, shard_pages=10, lease_time=120):
+    """
+    Claims and checks shards of the backfill until none is left, more
+    processes can run it at once (also on hosts sharing the cache
+    directory over a network filesystem with working file locks).
+
+    Commits are checked in the same order as by a single run, a worker
+    that crashed is replaced by the next one claiming its shard after
+    lease_time. When all shards are done, the incremental mark is moved
+    to the newest commit of the pinned history, commits whose status
+    failed are listed in the manifest and reported. DRY RUN checks all
+    shards without claiming them and leaves the manifest and the mark
+    as they are.
+    """
+    manifest = open_manifest(cache_dir)
+    executor = ThreadPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    try:
+        backfill = plan_backfill(git_session, manifest, com_context, owner,
+                                 repo, author, path, ref, shard_pages)
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        shards = iter(manifest.shards(backfill['id'])) if dry_run else None
+        while True:
+            if dry_run:
+                shard = next(shards, None)
+            else:
+                shard = manifest.claim(backfill['id'], worker, lease_time)
+            if shard is None:
+                break
+            backfill_shard(git_session, manifest, backfill, shard, worker,
+                           lease_time, com_context, owner, repo, author,
+                           path, rule_set, config, force, output_format,
+                           dry_run, executor)
+        done, total = manifest.progress(backfill['id'])
+        if done == total and backfill['newest_sha'] is not None and \
+                not dry_run:
+            state = open_state_store(cache_dir)
+            try:
+                state.set_mark(f'{owner}/{repo}', ref, com_context, author,
+                               path, backfill['newest_sha'])
+            finally:
+                state.close()
+        if output_format != 'none':
+            failures = manifest.failures(backfill['id'])
+            print(f'Backfill of {owner}/{repo} at {backfill["head_sha"]}: '
+                  f'{done} of {total} shards done, {len(failures)} '
+                  'statuses failed.', file=sys.stderr)
+            for sha in failures:
+                print(f'  - {sha}', file=sys.stderr)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+        manifest.close()
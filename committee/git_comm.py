@@ -1,8 +1,21 @@
 import click
-import requests
+import functools
+import os
 import sys
 import json
-from flask import request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import DEFAULT_POOLSIZE
+from committee.common_output import echo, capture, replay
+from committee.git_graphql import StatusIndex, history_pages
+from committee.git_local import local_pages
+from committee.rules.rule_validators import RuleSet
+from committee.git_session import GitSession
+from committee.git_status import StatusWriter
+from committee.storage.commit_cache import CommitCache
+from committee.storage.verdict_cache import VerdictCache
+from committee.storage.state_store import StateStore
+from committee.storage.http_cache import HttpCache
 
 
 def print_level(to_print, output_format):
@@ -10,7 +23,7 @@ def print_level(to_print, output_format):
     Wrapper to print only when output format is set to commits+
     """
     if output_format == 'commits' or output_format == 'rules':
-        click.echo(to_print)
+        echo(to_print)
 
 
 def get_statuses(broken_rules, git_session, com_context, owner, repo, sha,
@@ -26,74 +39,178 @@ def get_statuses(broken_rules, git_session, com_context, owner, repo, sha,
                               'target_url': target_url}))
 
 
-def set_status(commit, broken_rules, git_session, com_context, owner, repo,
-               sha, output_format, dry_run):
+def commit_info(commit):
     """
-    Sets the commit status unless it is a DRY RUN.
+    Returns sha and message of the commit, works for both API commits 
+    and webhook payload commits.
     """
     try:
         sha = commit['sha']
-        target_url = ''
     except KeyError:
-        target_url = request.base_url
+        sha = commit['id']
+    try:
+        message = commit['commit']['message']
+    except KeyError:
+        message = commit['message']
+    return sha, message
+
+
+def status_description(broken_rules):
+    """
+    Returns the status state and description based on rules broken.
+    """
+    if broken_rules:
+        rules = ', '.join(broken_rules)
+        return 'failure', f'The commit violates rules: {rules}.'
+    return 'success', 'No rules are violated by this commit.'
+
+
+def status_update(req, written=None):
+    """
+    Returns the line with result of the status update (req is None
+    for DRY RUN), written is the result of the status writer if used.
+    """
+    if written == 'skipped':
+        result = click.style('UNCHANGED', fg='yellow')
+    elif written == 'failed' or (req is not None and req.status_code >= 400):
+        result = click.style('ERROR', fg="magenta")
+    elif req is None:
+        result = click.style('DRY-RUN', fg='yellow')
+    else:
+        result = click.style('OK', fg="green")
+    return f'  ~> Updating commit status: {result}'
+
+
+def written_update(future):
+    """
+    Returns the line with result of the status queued in the writer.
+    """
+    written, req = future.result()
+    return status_update(req, written)
+
+
+def print_status_update(req, output_format):
+    """
+    Prints the result of the status update (req is None for DRY RUN).
+    """
+    print_level(status_update(req), output_format)
+
+
+def set_status(commit, broken_rules, git_session, com_context, owner, repo,
+               sha, output_format, dry_run, target_url=''):
+    """
+    Sets the commit status unless it is a DRY RUN. With the status writer
+    the status is only queued and its result is printed once written.
+    """
     if dry_run:
-        dry_text = click.style('DRY-RUN', fg='yellow')
-        print_level(f'  ~> Updating commit status: {dry_text}', output_format)
+        print_status_update(None, output_format)
+    elif git_session.status_writer is not None:
+        state, description = status_description(broken_rules)
+        future = git_session.status_writer.submit(
+            com_context, owner, repo, sha, state, description, target_url)
+        print_level(functools.partial(written_update, future),
+                    output_format)
     else:
-        if broken_rules:
-            rules = ', '.join(broken_rules)
-            description = f'The commit violates rules: {rules}.'
-            req = get_statuses(broken_rules, git_session, com_context, owner,
-                               repo, sha, 'failure', description, target_url)
-        else:
-            req = get_statuses(broken_rules, git_session, com_context, owner,
-                               repo, sha, 'success', 'No rules are violated by'
-                               ' this commit.', target_url)
-        if req.status_code >= 400:
-            error = click.style('ERROR', fg="magenta")
-            print_level(f'  ~> Updating commit status: {error}', output_format)
-        else:
-            ok = click.style('OK', fg="green")
-            print_level(f'  ~> Updating commit status: {ok}', output_format)
+        state, description = status_description(broken_rules)
+        req = get_statuses(broken_rules, git_session, com_context, owner,
+                           repo, sha, state, description, target_url)
+        print_status_update(req, output_format)
 
 
 bold_arrow = click.style('=> ', bold=True)
 
 
+def has_context(statuses, com_context):
+    """
+    Checks if any of the statuses was set with our context.
+    """
+    for st in statuses:
+        if st['context'] == com_context:
+            return True
+    return False
+
+
+def print_skipped(output_format):
+    """
+    Prints that the commit was skipped because of existing status.
+    """
+    skipped = click.style('SKIPPED', fg='yellow')
+    print_level(f'  {bold_arrow}{skipped} - This commit already has status'
+                ' with the same context.', output_format)
+
+
+def lookup_status(git_session, sha):
+    """
+    Looks the commit up in the status index of the session, 
+    returns None if the commit is not indexed.
+    """
+    if git_session.status_index is None:
+        return None
+    return git_session.status_index.lookup(sha)
+
+
+def status_exists(git_session, com_context, owner, repo, sha):
+    """
+    Checks if the commit already has status with our context, the status 
+    index is used when possible, otherwise statuses are paged through.
+    """
+    indexed = lookup_status(git_session, sha)
+    if indexed is not None:
+        return indexed
+    page_number = 0
+    while True:
+        page_number += 1
+        params = {'per_page': 100, 'page': page_number}
+        status = git_session.get(f'https://api.github.com/repos/{owner}/'
+                                 f'{repo}/commits/{sha}/status',
+                                 params=params)
+        statuses = status.json()['statuses']
+        if has_context(statuses, com_context):
+            return True
+        if len(statuses) < params['per_page']:
+            return False
+
+
+def load_statuses(git_session, owner, repo, commits, force):
+    """
+    Loads statuses of the whole page of commits into the status index
+    (with force only for the status writer to skip unchanged statuses).
+    """
+    if git_session.status_index is None or \
+            (force and git_session.status_writer is None):
+        return
+    git_session.status_index.load(git_session, owner, repo,
+                                  [commit_info(commit)[0]
+                                   for commit in commits])
+
+
 def handle_status(commit, broken_rules, git_session, com_context, owner, repo,
-                  sha, force, output_format, dry_run):
+                  sha, force, output_format, dry_run, target_url=''):
     """
     Manages if status should be updated or not. If force is true, 
     it will always override it.
     """
-    if force:
-        set_status(commit, broken_rules, git_session, com_context, owner, repo,
-                   sha, output_format, dry_run)
-    else:
-        page_number = 0
-        old_req = ''
-        while True:
-            page_number += 1
-            params = {'per_page': 100, 'page': page_number}
-            status = git_session.get(f'https://api.github.com/repos/{owner}/'
-                                     f'{repo}/commits/{sha}/status',
-                                     params=params)
-            statuses = status.json()['statuses']
-            if statuses == old_req:
-                break
-            old_req = statuses
-            for st in statuses:
-                if st['context'] == com_context:
-                    skipped = click.style('SKIPPED', fg='yellow')
-                    print_level(f'  {bold_arrow}{skipped} - This commit '
-                                'already has status with the same context.',
-                                output_format)
-                    return False
-        set_status(commit, broken_rules, git_session, com_context, owner, repo,
-                   sha, output_format, dry_run)
+    if not force:
+        if status_exists(git_session, com_context, owner, repo, sha):
+            print_skipped(output_format)
+            return False
+    set_status(commit, broken_rules, git_session, com_context, owner, repo,
+               sha, output_format, dry_run, target_url)
     return True
 
 
+def count_commit(git_session, broken_rules, handled):
+    """
+    Counts the checked commit in the session (for the summary).
+    """
+    if not handled:
+        git_session.count('commits', 'skipped')
+    elif broken_rules:
+        git_session.count('commits', 'failing')
+    else:
+        git_session.count('commits')
+
+
 def print_commit(commit, broken_rules, output_format):
     """
     Prints whether the commit is ok or not based on rules broken.
@@ -109,77 +226,484 @@ def print_commit(commit, broken_rules, output_format):
                     ' commit.', output_format)
 
 
-def resolve_commit(commit, rule_set, config, git_session, com_context, owner,
-                   repo, force, output_format, dry_run):
+def lookup_verdicts(git_session, sha, rule_set, output_format):
+    """
+    Returns verdicts of the rules known from the verdict cache 
+    of the session and the rule set of rules without verdict.
+    """
+    if git_session.verdict_cache is None:
+        return {}, rule_set
+    verdicts = git_session.verdict_cache.lookup(
+        sha, rule_set, output_format == 'rules')
+    if not verdicts:
+        return verdicts, rule_set
+    return verdicts, RuleSet(rule for rule in rule_set
+                             if rule not in verdicts)
+
+
+def evaluate_verdicts(git_session, sha, commit, rules, config, output_format,
+                      file_tree):
     """
-    Each commit is checked against all rules and its status is written
+    Evaluates the rules over the commit and stores their verdicts.
+    """
+    verdicts = dict(zip(rules, rules.verdicts(commit, config, output_format,
+                                              file_tree)))
+    if git_session.verdict_cache is not None:
+        git_session.verdict_cache.store(sha, verdicts)
+    return verdicts
+
+
+def replay_verdicts(rule_set, verdicts, output_format):
+    """
+    Prints output of the rules in the set order, returns the broken rules.
     """
     broken_rules = []
-    try:
-        sha = commit['sha']
-    except KeyError:
-        sha = commit['id']
-    try:
-        message = commit['commit']['message']
-    except KeyError:
-        message = commit['message']
-    file_tree = git_session.get(f'https://api.github.com/repos/{owner}/{repo}'
-                                f'/commits/{sha}').json()
-    print_level(f'- {sha}: {message}', output_format)
     for rule in rule_set:
-        rule.check(commit, config, broken_rules, output_format, file_tree)
-    if handle_status(commit, broken_rules, git_session, com_context, owner,
-                     repo, sha, force, output_format, dry_run):
+        violated, output = verdicts[rule]
+        if violated:
+            broken_rules.append(rule.rule_name)
+        if output_format == 'rules':
+            replay(output)
+    return broken_rules
+
+
+def fetch_commit(git_session, owner, repo, sha):
+    """
+    Retrieves the commit detail (file tree), the commit cache 
+    of the session is used when enabled.
+    """
+    cache = git_session.commit_cache
+    if cache is not None:
+        file_tree = cache.get(sha)
+        if file_tree is not None:
+            return file_tree
+    req = git_session.get(f'https://api.github.com/repos/{owner}/{repo}'
+                          f'/commits/{sha}')
+    file_tree = req.json()
+    if cache is not None and req.ok:
+        cache.put(sha, file_tree)
+    return file_tree
+
+
+def details_needed(commit, rule_set):
+    """
+    Checks if the rules need data missing in the listed commit (stats 
+    come with commits from GraphQL and local backends, files only 
+    with commits from the local backend).
+    """
+    needs = rule_set.needs()
+    return any(need in needs and need not in commit
+               for need in ('files', 'stats'))
+
+
+def commit_details(git_session, owner, repo, commit, rule_set):
+    """
+    Returns the file tree of the commit, it is fetched only when rules 
+    need it, otherwise it holds only data known from the listing.
+    """
+    if not details_needed(commit, rule_set):
+        return {key: commit[key] for key in ('stats', 'files')
+                if key in commit}
+    return fetch_commit(git_session, owner, repo, commit_info(commit)[0])
+
+
+def resolve_commit(commit, rule_set, config, git_session, com_context, owner,
+                   repo, force, output_format, dry_run, target_url=''):
+    """
+    Each commit is checked against all rules and its status is written 
+    (webhook statuses link to the target url). Cached verdicts are 
+    replayed, details are fetched only for rules without verdict.
+    """
+    sha, message = commit_info(commit)
+    print_level(f'- {sha}: {message}', output_format)
+    verdicts, missing = lookup_verdicts(git_session, sha, rule_set,
+                                        output_format)
+    if missing:
+        file_tree = commit_details(git_session, owner, repo, commit, missing)
+        verdicts.update(evaluate_verdicts(git_session, sha, commit, missing,
+                                          config, output_format, file_tree))
+    broken_rules = replay_verdicts(rule_set, verdicts, output_format)
+    handled = handle_status(commit, broken_rules, git_session, com_context,
+                            owner, repo, sha, force, output_format, dry_run,
+                            target_url)
+    if handled:
         print_commit(commit, broken_rules, output_format)
+    count_commit(git_session, broken_rules, handled)
 
 
-def pull_commits(git_session, com_context, owner, repo, author, path, ref,
-                 rule_set, config, force, output_format, dry_run):
+def resolve_captured(commit, rule_set, config, git_session, com_context,
+                     owner, repo, force, output_format, dry_run, target_url):
     """
-    Retrieves all commits from given repository. Handles Github pagination.
+    Resolves the commit in a worker thread, the output is captured 
+    and returned so it can be printed in the commit order.
     """
-    page_amount = 0
-    while True:
-        page_amount += 1
-        params = {'author': author, 'path': path, 'sha': ref,
-                  'per_page': 100, 'page': page_amount}
-        req = git_session.get("https://api.github.com/repos/"
-                              f"{owner}/{repo}/commits", params=params)
-        if not req.ok:
-            print("Failed to retrieve commits from "
-                  f"repository {owner}/{repo}.", file=sys.stderr)
-            sys.exit(1)
-        for commit in req.json():
+    with capture() as output:
+        resolve_commit(commit, rule_set, config, git_session, com_context,
+                       owner, repo, force, output_format, dry_run, target_url)
+    return output
+
+
+def resolve_commits(commits, rule_set, config, git_session, com_context,
+                    owner, repo, force, output_format, dry_run, executor,
+                    target_url=''):
+    """
+    Resolves the commits one by one, or concurrently in the executor 
+    (output is still printed in the commit order). One by one with the
+    status writer, output of a few commits is held back so the checking
+    goes on while their statuses are written.
+    """
+    if executor is None and git_session.status_writer is None:
+        for commit in commits:
             resolve_commit(commit, rule_set, config, git_session,
                            com_context, owner, repo, force,
-                           output_format, dry_run)
-        if req.text == '[]' or len(req.text) < 20:
-            break
+                           output_format, dry_run, target_url)
+        return
+    if executor is None:
+        window = deque()
+        for commit in commits:
+            window.append(resolve_captured(
+                commit, rule_set, config, git_session, com_context, owner,
+                repo, force, output_format, dry_run, target_url))
+            if len(window) > git_session.status_writer.max_in_flight:
+                replay(window.popleft())
+        while window:
+            replay(window.popleft())
+        return
+    futures = [executor.submit(resolve_captured, commit, rule_set, config,
+                               git_session, com_context, owner, repo, force,
+                               output_format, dry_run, target_url)
+               for commit in commits]
+    for future in futures:
+        replay(future.result())
+
+
+def commits_until(commits, stop_sha):
+    """
+    Cuts the page at the already checked commit (if present), returns 
+    the commits to check and whether the checked commit was reached.
+    """
+    if stop_sha is not None:
+        for index, commit in enumerate(commits):
+            if commit_info(commit)[0] == stop_sha:
+                return commits[:index], True
+    return commits, False
+
+
+def pull_commits(git_session, com_context, owner, repo, author, path, ref,
+                 rule_set, config, force, output_format, dry_run, jobs=1,
+                 stop_sha=None, backend='rest', repo_path=None):
+    """
+    Retrieves all commits from given repository (from REST or GraphQL 
+    backend, or from the local clone). Handles Github pagination.
+
+    With more than one job, commits of each page are checked by a pool 
+    of worker threads. Pagination stops at stop_sha (already checked 
+    by previous run). Returns SHA of the newest commit.
+    """
+    if jobs > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            return pull_pages(git_session, com_context, owner, repo, author,
+                              path, ref, rule_set, config, force,
+                              output_format, dry_run, executor, stop_sha,
+                              backend, repo_path)
+    return pull_pages(git_session, com_context, owner, repo, author, path,
+                      ref, rule_set, config, force, output_format, dry_run,
+                      None, stop_sha, backend, repo_path)
+
+
+def commits_failed(owner, repo):
+    """
+    Reports that commits could not be retrieved and exits.
+    """
+    print("Failed to retrieve commits from "
+          f"repository {owner}/{repo}.", file=sys.stderr)
+    sys.exit(1)
+
+
+def next_page_url(req):
+    """
+    Returns URL of the next page from the Link header (None on last page).
+    """
+    return req.links.get('next', {}).get('url')
+
+
+def commit_pages(git_session, owner, repo, author, path, ref, prefetch=True):
+    """
+    Generator of commit pages, follows Link rel="next" headers.
+
+    The next page is requested in background while the current page 
+    is being checked (when prefetch is on).
+    """
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    future = None
+    try:
+        req = git_session.get("https://api.github.com/repos/"
+                              f"{owner}/{repo}/commits",
+                              params={'author': author, 'path': path,
+                                      'sha': ref, 'per_page': 100})
+        while True:
+            if not req.ok:
+                commits_failed(owner, repo)
+            next_url = next_page_url(req)
+            if next_url is not None and executor is not None:
+                future = executor.submit(git_session.get, next_url)
+            yield req.json()
+            if next_url is None:
+                return
+            if future is not None:
+                req = future.result()
+                future = None
+            else:
+                req = git_session.get(next_url)
+    finally:
+        if executor is not None:
+            if future is not None:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+
+def backend_pages(git_session, owner, repo, author, path, ref,
+                  backend='rest', repo_path=None):
+    """
+    Returns generator of commit pages read by the backend (a page
+    is None when it could not be read).
+    """
+    if backend == 'graphql':
+        return history_pages(git_session, owner, repo, author, path, ref)
+    if backend == 'local':
+        return local_pages(repo_path, author, path, ref)
+    return commit_pages(git_session, owner, repo, author, path, ref)
+
+
+def pull_pages(git_session, com_context, owner, repo, author, path, ref,
+               rule_set, config, force, output_format, dry_run, executor,
+               stop_sha, backend='rest', repo_path=None):
+    """
+    Loops the commit pages and resolves commits of each page.
+    """
+    newest = None
+    pages = backend_pages(git_session, owner, repo, author, path, ref,
+                          backend, repo_path)
+    try:
+        for commits in pages:
+            if commits is None:
+                commits_failed(owner, repo)
+            if newest is None and commits:
+                newest = commit_info(commits[0])[0]
+            commits, reached = commits_until(commits, stop_sha)
+            load_statuses(git_session, owner, repo, commits, force)
+            resolve_commits(commits, rule_set, config, git_session,
+                            com_context, owner, repo, force, output_format,
+                            dry_run, executor)
+            if reached:
+                break
+    finally:
+        pages.close()
+    return newest
+
+
+def payload_commits(from_request):
+    """
+    Returns all commits of the push payload including the head commit, 
+    each commit only once.
+    """
+    commits = {}
+    for commit in from_request.get('commits') or []:
+        commits[commit['id']] = commit
+    head_commit = from_request.get('head_commit')
+    if head_commit:
+        commits.setdefault(head_commit['id'], head_commit)
+    return list(commits.values())
 
 
 def parse_commits(git_session, com_context, owner, repo, rule_set, config,
-                  force, output_format, dry_run, from_request):
+                  force, output_format, dry_run, from_request, jobs=1,
+                  target_url=''):
+    """
+    Retrieves the commit array from the Github request and checks 
+    all the commits concurrently.
     """
-    Retrieves the commit array from the Github request.
+    commits = payload_commits(from_request)
+    load_statuses(git_session, owner, repo, commits, force)
+    workers = min(jobs, len(commits))
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            resolve_commits(commits, rule_set, config, git_session,
+                            com_context, owner, repo, force, output_format,
+                            dry_run, executor, target_url)
+    else:
+        resolve_commits(commits, rule_set, config, git_session, com_context,
+                        owner, repo, force, output_format, dry_run, None,
+                        target_url)
+
+
+def open_commit_cache(cache_dir, cache_size):
     """
-    resolve_commit(from_request['commits'][0], rule_set, config, git_session,
-                   com_context, owner, repo, force,
-                   output_format, dry_run)
+    Opens the commit cache in the cache directory (size is in megabytes), 
+    returns None when no directory is set.
+    """
+    if not cache_dir:
+        return None
+    return CommitCache(os.path.join(cache_dir, 'commits.sqlite'),
+                       cache_size * 1024 * 1024)
+
+
+def open_verdict_cache(cache_dir, cache_size):
+    """
+    Opens the verdict cache in the cache directory, 
+    returns None when no directory is set.
+    """
+    if not cache_dir:
+        return None
+    return VerdictCache(os.path.join(cache_dir, 'verdicts.sqlite'),
+                        cache_size * 1024 * 1024)
+
+
+def open_http_cache(cache_dir, cache_size):
+    """
+    Opens the HTTP response cache, it is kept only in memory when 
+    no cache directory is set.
+    """
+    path = ':memory:'
+    if cache_dir:
+        path = os.path.join(cache_dir, 'http.sqlite')
+    return HttpCache(path, cache_size * 1024 * 1024)
+
+
+def close_session(git_session):
+    """
+    Waits for queued statuses and closes stores opened for the session.
+    """
+    if git_session.status_writer is not None:
+        git_session.status_writer.close()
+    for store in (git_session.http_cache, git_session.commit_cache,
+                  git_session.verdict_cache):
+        if store is not None:
+            store.close()
+
+
+def open_state_store(cache_dir):
+    """
+    Opens the incremental state store in the cache directory.
+    """
+    return StateStore(os.path.join(cache_dir, 'state.sqlite'))
 
 
 def start_session(git_token, com_context, owner, repo, author, path, ref,
                   rule_set, config, force, output_format, dry_run,
-                  from_request):
-    """
-    Creates a Github session with token auth, 
-    retrieves all commits and loops them
-    """
-    with requests.Session() as git_session:
-        auth = {'Authorization': f'token {git_token}'}
-        git_session.headers.update(auth)
-        if from_request == '':
-            pull_commits(git_session, com_context, owner, repo, author, path,
-                         ref, rule_set, config, force, output_format, dry_run)
-        else:
-            parse_commits(git_session, com_context, owner, repo, rule_set,
-                          config, force, output_format, dry_run, from_request)
+                  from_request, jobs=1, use_async=False, cache_dir=None,
+                  cache_size=256, incremental=False, target_url='',
+                  adapter=None, backend='rest', repo_path=None,
+                  backfill=False, shard_pages=10):
+    """
+    Creates a Github session with token auth (connections come from
+    the shared adapter if given), retrieves all commits and loops them 
+    (optionally in asyncio pipeline or in shards of the backfill),
+    returns the summary of the run.
+    """
+    with GitSession(git_token, max(jobs, DEFAULT_POOLSIZE),
+                    adapter) as git_session:
+        git_session.http_cache = open_http_cache(cache_dir, cache_size)
+        git_session.status_index = StatusIndex(com_context)
+        git_session.commit_cache = open_commit_cache(cache_dir, cache_size)
+        git_session.verdict_cache = open_verdict_cache(cache_dir, cache_size)
+        if not dry_run:
+            git_session.status_writer = StatusWriter(git_session,
+                                                     max(jobs, 4))
+        try:
+            if from_request == '' and backfill:
+                # git_backfill builds on this module, import it only when used
+                from committee.git_backfill import run_backfill
+                run_backfill(git_session, com_context, owner, repo, author,
+                             path, ref, rule_set, config, force,
+                             output_format, dry_run, jobs, cache_dir,
+                             shard_pages)
+            elif from_request == '' and incremental:
+                pull_incremental(git_session, com_context, owner, repo,
+                                 author, path, ref, rule_set, config, force,
+                                 output_format, dry_run, jobs, use_async,
+                                 cache_dir, backend, repo_path)
+            else:
+                run_session(git_session, com_context, owner, repo, author,
+                            path, ref, rule_set, config, force, output_format,
+                            dry_run, from_request, jobs, use_async,
+                            target_url=target_url, backend=backend,
+                            repo_path=repo_path)
+        finally:
+            close_session(git_session)
+            if output_format == 'rules':
+                print(git_session.rate_limiter.report(), file=sys.stderr)
+            if output_format != 'none' and \
+                    git_session.status_writer is not None:
+                print(git_session.status_writer.report(), file=sys.stderr)
+    return session_summary(git_session)
+
+
+def session_summary(git_session):
+    """
+    Returns counts of checked commits and written statuses of the session.
+    """
+    summary = {key: git_session.counts[key]
+               for key in ('commits', 'failing', 'skipped')}
+    if git_session.status_writer is not None:
+        summary.update({f'statuses_{key}': count for key, count
+                        in git_session.status_writer.counts.items()})
+    return summary
+
+
+def run_session(git_session, com_context, owner, repo, author, path, ref,
+                rule_set, config, force, output_format, dry_run, from_request,
+                jobs, use_async, stop_sha=None, target_url='',
+                backend='rest', repo_path=None):
+    """
+    Checks commits of the request or all commits of the repository 
+    (newer than stop_sha), returns SHA of the newest commit.
+    """
+    if from_request == '' and use_async:
+        # git_async builds on this module, import it only when used
+        from committee.git_async import pull_commits_asyncio
+        return pull_commits_asyncio(git_session, com_context, owner, repo,
+                                    author, path, ref, rule_set, config,
+                                    force, output_format, dry_run, jobs,
+                                    stop_sha, target_url, backend, repo_path)
+    elif from_request == '':
+        return pull_commits(git_session, com_context, owner, repo, author,
+                            path, ref, rule_set, config, force, output_format,
+                            dry_run, jobs, stop_sha, backend, repo_path)
+    parse_commits(git_session, com_context, owner, repo, rule_set,
+                  config, force, output_format, dry_run, from_request, jobs,
+                  target_url)
+    return None
+
+
+def statuses_written(git_session):
+    """
+    Waits for statuses queued in the status writer, returns False
+    if any of them failed to be written.
+    """
+    if git_session.status_writer is None:
+        return True
+    return git_session.status_writer.flush()
+
+
+def pull_incremental(git_session, com_context, owner, repo, author, path, ref,
+                     rule_set, config, force, output_format, dry_run, jobs,
+                     use_async, cache_dir, backend='rest', repo_path=None):
+    """
+    Checks only commits newer than the high-water mark of the previous 
+    run, the mark is moved once the run finishes and all its statuses
+    are written (not in DRY RUN, no statuses were set then).
+    """
+    state = open_state_store(cache_dir)
+    try:
+        reposlug = f'{owner}/{repo}'
+        stop_sha = state.get_mark(reposlug, ref, com_context, author, path)
+        newest = run_session(git_session, com_context, owner, repo, author,
+                             path, ref, rule_set, config, force,
+                             output_format, dry_run, '', jobs, use_async,
+                             stop_sha, backend=backend, repo_path=repo_path)
+        if newest is not None and not dry_run and \
+                statuses_written(git_session):
+            state.set_mark(reposlug, ref, com_context, author, path, newest)
+    finally:
+        state.close()
@@ -0,0 +1,181 @@
+import json
+import threading
+
+
+GRAPHQL_URL = 'https://api.github.com/graphql'
+
+
+def graphql(git_session, query, variables=None):
+    """
+    Sends a GraphQL query, returns the data or None when it failed.
+    """
+    req = git_session.post(GRAPHQL_URL, data=json.dumps(
+        {'query': query, 'variables': variables or {}}))
+    if not req.ok:
+        return None
+    result = req.json()
+    if result.get('errors') or not result.get('data'):
+        return None
+    return result['data']
+
+
+def status_query(count):
+    """
+    Builds a query for status contexts of count commits (one alias
+    per commit), SHAs are passed as variables c0, c1...
+    """
+    oids = ''.join(f', $c{index}: GitObjectID!' for index in range(count))
+    objects = ''.join(
+        f'c{index}: object(oid: $c{index}) {{ ... on Commit {{ status {{ '
+        'contexts { context state description } } } } '
+        for index in range(count))
+    return (f'query($owner: String!, $repo: String!{oids}) {{ '
+            f'repository(owner: $owner, name: $repo) {{ {objects}}} }}')
+
+
+class StatusIndex:
+    """
+    In-memory index of statuses with our context, kept for the whole run.
+
+    Statuses of a whole batch of commits are loaded by a single GraphQL
+    query, checking a commit is then only a dictionary lookup. Commits
+    that were not loaded (or failed to load) are unknown and have to be
+    checked through the REST API.
+    """
+    batch_size = 50
+
+    def __init__(self, com_context):
+        self.com_context = com_context
+        self.statuses = {}
+        self.lock = threading.Lock()
+
+    def load(self, git_session, owner, repo, shas):
+        """
+        Loads statuses of the commits that are not known yet.
+        """
+        with self.lock:
+            missing = [sha for sha in dict.fromkeys(shas)
+                       if sha not in self.statuses]
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            variables = {f'c{index}': sha for index, sha in enumerate(batch)}
+            variables.update({'owner': owner, 'repo': repo})
+            data = graphql(git_session, status_query(len(batch)), variables)
+            if data is None or data.get('repository') is None:
+                return
+            repository = data['repository']
+            for index, sha in enumerate(batch):
+                commit = repository.get(f'c{index}')
+                if commit is None:
+                    continue
+                contexts = (commit.get('status') or {}).get('contexts') or []
+                self.add(sha, contexts)
+
+    def add(self, sha, contexts):
+        """
+        Stores our status of the commit from its status contexts.
+        """
+        own = None
+        for context in contexts:
+            if context['context'] == self.com_context:
+                own = context
+                break
+        with self.lock:
+            self.statuses[sha] = own
+
+    def lookup(self, sha):
+        """
+        Returns True/False if the commit has status with our context,
+        None if the commit is not in the index.
+        """
+        with self.lock:
+            if sha not in self.statuses:
+                return None
+            return self.statuses[sha] is not None
+
+    def current(self, sha):
+        """
+        Returns our status context of the commit (with its state and
+        description), None if there is none or the commit is unknown.
+        """
+        with self.lock:
+            return self.statuses.get(sha)
+
+
+HISTORY_QUERY = '''
+query($owner: String!, $repo: String!, $ref: String!, $after: String,
+      $path: String, $author: CommitAuthor) {
+  repository(owner: $owner, name: $repo) {
+    object(expression: $ref) {
+      ... on Commit {
+        history(first: 100, after: $after, path: $path, author: $author) {
+          pageInfo { hasNextPage endCursor }
+          nodes {
+            oid message additions deletions
+            status { contexts { context state description } }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+
+def history_author(git_session, author):
+    """
+    Returns the GraphQL author filter for login or email address,
+    False when the login does not exist.
+    """
+    if not author:
+        return None
+    if '@' in author:
+        return {'emails': [author]}
+    data = graphql(git_session, 'query($login: String!) { '
+                   'user(login: $login) { id } }', {'login': author})
+    if data is None or data.get('user') is None:
+        return False
+    return {'id': data['user']['id']}
+
+
+def history_commit(node):
+    """
+    Converts the history node into the shape of a REST API commit 
+    (with commit stats, files are not available in GraphQL).
+    """
+    return {'sha': node['oid'],
+            'commit': {'message': node['message']},
+            'stats': {'additions': node['additions'],
+                      'deletions': node['deletions'],
+                      'total': node['additions'] + node['deletions']}}
+
+
+def history_pages(git_session, owner, repo, author, path, ref):
+    """
+    Generator of commit pages from the GraphQL API, a single query 
+    returns messages, stats and status contexts of 100 commits 
+    (status contexts are added to the status index of the session).
+    Yields None when the history could not be retrieved.
+    """
+    author_filter = history_author(git_session, author)
+    if author_filter is False:
+        yield None
+        return
+    variables = {'owner': owner, 'repo': repo, 'ref': ref or 'HEAD',
+                 'path': path or None, 'author': author_filter,
+                 'after': None}
+    while True:
+        data = graphql(git_session, HISTORY_QUERY, variables)
+        target = ((data or {}).get('repository') or {}).get('object')
+        if target is None or 'history' not in target:
+            yield None
+            return
+        history = target['history']
+        if git_session.status_index is not None:
+            for node in history['nodes']:
+                contexts = (node.get('status') or {}).get('contexts') or []
+                git_session.status_index.add(node['oid'], contexts)
+        yield [history_commit(node) for node in history['nodes']]
+        if not history['pageInfo']['hasNextPage']:
+            return
+        variables['after'] = history['pageInfo']['endCursor']
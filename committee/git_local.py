@@ -0,0 +1,122 @@
+import io
+import subprocess
+import sys
+import tempfile
+
+
+# Status letters of git --raw output and their Github names
+FILE_STATUSES = {'A': 'added', 'D': 'removed', 'M': 'modified',
+                 'R': 'renamed', 'C': 'copied', 'T': 'changed',
+                 'U': 'modified'}
+
+LOG_FORMAT = '%x1e%H%x1f%B%x1f'
+
+
+def log_command(repo_path, author, path, ref):
+    """
+    Returns the git log command listing commits with their files
+    (--raw) and line stats (--numstat), merges are compared
+    to their first parent as on Github. Commits filtered by path
+    still list all their files (--full-diff) as on Github.
+    """
+    command = ['git', '-C', repo_path, 'log', '-z', '--raw', '--numstat',
+               '-M', '--diff-merges=first-parent', '--full-diff',
+               f'--format={LOG_FORMAT}']
+    if author:
+        command.append(f'--author={author}')
+    command.append(ref or 'HEAD')
+    command.append('--')
+    if path:
+        command.append(path)
+    return command
+
+
+def parse_record(record):
+    """
+    Parses one commit of the log into the shape of a Github API commit
+    with its stats and files.
+    """
+    sha, message, changes = record.split('\x1f', 2)
+    tokens = iter(changes.split('\0'))
+    files = {}
+    for token in tokens:
+        token = token.lstrip('\n')
+        if not token:
+            continue
+        if token.startswith(':'):
+            letter = token.rsplit(' ', 1)[-1][:1]
+            entry = {'status': FILE_STATUSES.get(letter, 'modified'),
+                     'additions': 0, 'deletions': 0, 'changes': 0}
+            if letter in 'RC':
+                entry['previous_filename'] = next(tokens)
+            entry['filename'] = next(tokens)
+            files[entry['filename']] = entry
+            continue
+        additions, deletions, file_name = token.split('\t', 2)
+        if not file_name:
+            next(tokens)
+            file_name = next(tokens)
+        entry = files.get(file_name)
+        if entry is None:
+            continue
+        entry['additions'] = int(additions) if additions != '-' else 0
+        entry['deletions'] = int(deletions) if deletions != '-' else 0
+        entry['changes'] = entry['additions'] + entry['deletions']
+    additions = sum(entry['additions'] for entry in files.values())
+    deletions = sum(entry['deletions'] for entry in files.values())
+    return {'sha': sha,
+            'commit': {'message': message.rstrip('\n')},
+            'stats': {'additions': additions, 'deletions': deletions,
+                      'total': additions + deletions},
+            'files': list(files.values())}
+
+
+def local_commits(repo_path, author, path, ref, chunk_size=1 << 16):
+    """
+    Generator of commits read from the local clone by a single streamed
+    git log, exits when git fails.
+    """
+    errors = tempfile.TemporaryFile(mode='w+')
+    process = subprocess.Popen(log_command(repo_path, author, path, ref),
+                               stdout=subprocess.PIPE, stderr=errors)
+    output = io.TextIOWrapper(process.stdout, encoding='utf-8',
+                              errors='replace', newline='')
+    try:
+        buffer = ''
+        while True:
+            chunk = output.read(chunk_size)
+            if not chunk:
+                break
+            records = (buffer + chunk).split('\x1e')
+            buffer = records.pop()
+            for record in records:
+                if record:
+                    yield parse_record(record)
+        if buffer:
+            yield parse_record(buffer)
+        if process.wait() != 0:
+            errors.seek(0)
+            print(errors.read().strip(), file=sys.stderr)
+            print("Failed to retrieve commits from "
+                  f"repository {repo_path}.", file=sys.stderr)
+            sys.exit(1)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        output.close()
+        errors.close()
+
+
+def local_pages(repo_path, author, path, ref, per_page=100):
+    """
+    Generator of commit pages from the local clone.
+    """
+    page = []
+    for commit in local_commits(repo_path, author, path, ref):
+        page.append(commit)
+        if len(page) == per_page:
+            yield page
+            page = []
+    if page:
+        yield page
@@ -0,0 +1,200 @@
+import hashlib
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+
+def url_resource(url):
+    """
+    Returns the rate limit resource (budget) of the request URL.
+    """
+    path = urlparse(url).path
+    if path == '/graphql':
+        return 'graphql'
+    if path.startswith('/search/'):
+        return 'search'
+    return 'core'
+
+
+class Budget:
+    """
+    Rate limit budget of one resource (core, graphql, search...).
+    """
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset = 0
+        self.next_slot = 0
+        self.blocked_until = 0
+
+
+class RateLimiter:
+    """
+    Request scheduler that keeps the Github API budgets of a token.
+
+    Github keeps a separate budget for every resource (REST requests
+    are 'core', GraphQL queries 'graphql'), the budget of the request
+    is known from its URL and updated from X-RateLimit-* headers
+    (X-RateLimit-Resource tells which budget the response belongs to).
+    Requests run at full speed while there is enough budget left, below
+    the pacing threshold they are spread evenly until the budget resets.
+    Rate limited responses (403/429 with Retry-After or exhausted budget)
+    and temporary server errors are retried with jittered backoff.
+
+    One limiter is shared by all sessions using the same token
+    (see for_token), since the budgets belong to the token.
+    """
+    limiters = {}
+    limiters_lock = threading.Lock()
+
+    def __init__(self, pacing_threshold=0.2, reserve=10, max_retries=5,
+                 max_backoff=60):
+        self.pacing_threshold = pacing_threshold
+        self.reserve = reserve
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+        self.budgets = {}
+        self.requests = 0
+        self.retries = 0
+        self.waited = 0.0
+        self.recent = deque()
+
+    @classmethod
+    def for_token(cls, git_token):
+        """
+        Returns the limiter shared by all sessions of the token.
+        """
+        key = hashlib.sha256(str(git_token).encode()).hexdigest()
+        with cls.limiters_lock:
+            if key not in cls.limiters:
+                cls.limiters[key] = cls()
+            return cls.limiters[key]
+
+    def budget(self, resource):
+        """
+        Returns the budget of the resource (call with the lock held).
+        """
+        if resource not in self.budgets:
+            self.budgets[resource] = Budget()
+        return self.budgets[resource]
+
+    def delay(self, budget, now):
+        """
+        Reserves the slot for the next request of the budget,
+        returns how long to wait.
+        """
+        start = max(now, budget.next_slot, budget.blocked_until)
+        if budget.remaining is not None and budget.reset > start:
+            usable = budget.remaining - self.reserve
+            if usable <= 0:
+                start = budget.reset
+            elif budget.remaining < budget.limit * self.pacing_threshold:
+                budget.next_slot = start + (budget.reset - start) / usable
+        if budget.remaining is not None and budget.remaining > 0:
+            budget.remaining -= 1
+        return start - now
+
+    def trim(self, now):
+        """
+        Forgets requests older than a minute (call with the lock held).
+        """
+        while self.recent and self.recent[0] < now - 60:
+            self.recent.popleft()
+
+    def acquire(self, resource='core'):
+        """
+        Waits until the request fits into the budget of the resource.
+        """
+        with self.lock:
+            wait = self.delay(self.budget(resource), time.time())
+            self.waited += max(wait, 0)
+        if wait > 0:
+            time.sleep(wait)
+        with self.lock:
+            now = time.time()
+            self.requests += 1
+            self.recent.append(now)
+            self.trim(now)
+
+    def update(self, response, attempt, resource='core'):
+        """
+        Updates the budget from the response, returns the time to wait
+        before retrying the request or None if it should not be retried.
+        """
+        headers = response.headers
+        with self.lock:
+            budget = self.budget(headers.get('X-RateLimit-Resource',
+                                             resource))
+            try:
+                budget.limit = int(headers['X-RateLimit-Limit'])
+                budget.remaining = int(headers['X-RateLimit-Remaining'])
+                budget.reset = float(headers['X-RateLimit-Reset'])
+            except (KeyError, ValueError):
+                pass
+            if attempt >= self.max_retries:
+                return None
+            wait = self.retry_delay(response, attempt, budget)
+            if wait is not None:
+                self.retries += 1
+                budget.blocked_until = max(budget.blocked_until,
+                                           time.time() + wait)
+            return wait
+
+    def retry_delay(self, response, attempt, budget):
+        """
+        Decides if the response was rate limited (or temporary failure)
+        and returns jittered backoff, None means no retry.
+        """
+        status = response.status_code
+        retry_after = response.headers.get('Retry-After')
+        if status in (403, 429):
+            if retry_after is not None:
+                try:
+                    return float(retry_after) + random.uniform(0, 1)
+                except ValueError:
+                    pass
+            if response.headers.get('X-RateLimit-Remaining') == '0':
+                return max(budget.reset - time.time(), 0) + \
+                    random.uniform(0, 1)
+            if status == 403 and 'rate limit' not in response.text.lower():
+                return None
+        elif status not in (502, 503, 504):
+            return None
+        backoff = min(self.max_backoff, 2 ** attempt)
+        return random.uniform(backoff / 2, backoff)
+
+    def stats(self):
+        """
+        Returns current throughput (requests per second over the last
+        minute) and numbers of the budgets.
+        """
+        with self.lock:
+            now = time.time()
+            self.trim(now)
+            span = min(60.0, max(now - self.recent[0], 1.0)) \
+                if self.recent else 60.0
+            return {'throughput': len(self.recent) / span,
+                    'requests': self.requests,
+                    'retries': self.retries,
+                    'waited': self.waited,
+                    'budgets': {resource: {'limit': budget.limit,
+                                           'remaining': budget.remaining,
+                                           'reset': budget.reset}
+                                for resource, budget
+                                in sorted(self.budgets.items())}}
+
+    def report(self):
+        """
+        Returns the stats as a single line of text.
+        """
+        stats = self.stats()
+        budgets = ', '.join(
+            f"{resource} {budget['remaining']}/{budget['limit']} "
+            f"(resets in {max(budget['reset'] - time.time(), 0):.0f}s)"
+            for resource, budget in stats['budgets'].items())
+        return (f"Github API: {stats['requests']} requests "
+                f"({stats['throughput']:.1f}/s), {stats['retries']} retries, "
+                f"waited {stats['waited']:.1f}s, budgets: {budgets or 'none'}")
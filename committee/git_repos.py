@@ -0,0 +1,94 @@
+import click
+from concurrent.futures import ThreadPoolExecutor
+from committee.common_output import capture
+from committee.git_comm import next_page_url
+from committee.git_session import GitSession
+
+
+SUMMARY_KEYS = ('commits', 'failing', 'skipped', 'statuses_posted',
+                'statuses_skipped', 'statuses_failed')
+
+
+def read_repos_file(repos_file):
+    """
+    Reads reposlugs from the file, one per line, empty lines and lines
+    starting with # are ignored.
+    """
+    reposlugs = []
+    with open(repos_file) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                reposlugs.append(line)
+    return reposlugs
+
+
+def org_repos(git_token, org, adapter=None):
+    """
+    Lists repositories of the organization (or user), archived
+    and disabled repositories are left out (statuses cannot be set).
+    """
+    with GitSession(git_token, adapter=adapter) as git_session:
+        url = f'https://api.github.com/orgs/{org}/repos'
+        params = {'per_page': 100, 'type': 'all'}
+        req = git_session.get(url, params=params)
+        if req.status_code == 404:
+            url = f'https://api.github.com/users/{org}/repos'
+            req = git_session.get(url, params=params)
+        reposlugs = []
+        while True:
+            if req.status_code != 200:
+                raise click.BadParameter('Failed to list repositories of '
+                                         f'"{org}"!', param_hint='\'--org\'')
+            reposlugs.extend(repo['full_name'] for repo in req.json()
+                             if not repo.get('archived') and
+                             not repo.get('disabled'))
+            url = next_page_url(req)
+            if url is None:
+                return reposlugs
+            req = git_session.get(url)
+
+
+def check_captured(runner, reposlug):
+    """
+    Checks the repository with captured output, returns the summary
+    (or the error why the repository could not be checked) and the output.
+    """
+    summary, error = None, None
+    with capture() as output:
+        try:
+            summary = runner(reposlug)
+        except click.ClickException as exception:
+            error = exception.format_message()
+        except SystemExit:
+            error = 'Failed to retrieve commits.'
+        except Exception as exception:
+            error = repr(exception)
+    return summary, error, output
+
+
+def check_repos(runner, reposlugs, workers):
+    """
+    Generator checking the repositories by the runner in workers,
+    yields reposlug, summary, error and captured output of each
+    repository in the given order.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(check_captured, runner, reposlug)
+                   for reposlug in reposlugs]
+        for reposlug, future in zip(reposlugs, futures):
+            yield (reposlug, *future.result())
+
+
+def summary_line(summary):
+    """
+    Returns the summary of checked commits and statuses as text.
+    """
+    line = (f"{summary['commits']} commits, {summary['failing']} failing, "
+            f"{summary['skipped']} skipped")
+    if summary['statuses_posted'] or summary['statuses_skipped'] or \
+            summary['statuses_failed']:
+        line += (f"; statuses {summary['statuses_posted']} posted, "
+                 f"{summary['statuses_skipped']} unchanged, "
+                 f"{summary['statuses_failed']} failed")
+    return line
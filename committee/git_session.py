@@ -0,0 +1,163 @@
+import socket
+import threading
+import time
+import requests
+from collections import Counter
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
+from urllib3.connection import HTTPConnection
+from committee.git_ratelimit import RateLimiter, url_resource
+
+
+class SharedAdapter(HTTPAdapter):
+    """
+    Keep-alive connection pool shared by all sessions of a long running
+    process (the web server), so requests do not pay a new TLS handshake.
+
+    Sessions do not close the pool when they are closed, it is closed
+    by shutdown. Idle pooled connections are kept alive by TCP keep-alive
+    probes every keep_alive seconds, 0 turns connection reuse off.
+    """
+    def __init__(self, pool_size=DEFAULT_POOLSIZE, keep_alive=60):
+        self.keep_alive = keep_alive
+        super().__init__(pool_maxsize=pool_size)
+
+    def init_poolmanager(self, connections, maxsize, block=False,
+                         **pool_kwargs):
+        """
+        Creates the pool with TCP keep-alive enabled on its sockets.
+        """
+        if getattr(self, 'keep_alive', 0) > 0:
+            options = list(HTTPConnection.default_socket_options)
+            options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+            for name in ('TCP_KEEPIDLE', 'TCP_KEEPINTVL'):
+                if hasattr(socket, name):
+                    options.append((socket.IPPROTO_TCP, getattr(socket, name),
+                                    self.keep_alive))
+            pool_kwargs['socket_options'] = options
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+
+    def add_headers(self, request, **kwargs):
+        """
+        Asks the server to close the connection when reuse is off.
+        """
+        if not self.keep_alive:
+            request.headers['Connection'] = 'close'
+
+    def close(self):
+        """
+        Kept open when a session using the pool is closed.
+        """
+
+    def shutdown(self):
+        """
+        Closes all pooled connections.
+        """
+        super().close()
+
+
+class GitSession(requests.Session):
+    """
+    Github session with token auth and pooled keep-alive connections.
+
+    Every request goes through the rate limiter of the token, rate limited
+    responses are retried with backoff.
+
+    GET requests are conditional when the HTTP cache is set, responses
+    with ETag or Last-Modified are stored and 304 Not Modified answers
+    are served from the cache (they do not count against rate limits).
+
+    Besides HTTP, the session carries optional helpers shared by the whole
+    run (for example the status index), they are None when not used.
+
+    Connections come from the given (shared) adapter, or from a pool
+    of the session itself.
+    """
+    def __init__(self, git_token, pool_size=DEFAULT_POOLSIZE, adapter=None):
+        super().__init__()
+        auth = {'Authorization': f'token {git_token}'}
+        self.headers.update(auth)
+        if adapter is None:
+            adapter = HTTPAdapter(pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.rate_limiter = RateLimiter.for_token(git_token)
+        self.http_cache = None
+        self.status_index = None
+        self.status_writer = None
+        self.commit_cache = None
+        self.verdict_cache = None
+        self.counts = Counter()
+        self.counts_lock = threading.Lock()
+
+    def count(self, *events):
+        """
+        Counts events of the run (checked commits and their results).
+        """
+        with self.counts_lock:
+            self.counts.update(events)
+
+    def send_limited(self, method, url, **kwargs):
+        """
+        Sends the request when the budget allows it, retries it 
+        if it was rate limited.
+        """
+        resource = url_resource(url)
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(resource)
+            response = super().request(method, url, **kwargs)
+            wait = self.rate_limiter.update(response, attempt, resource)
+            if wait is None:
+                return response
+            time.sleep(wait)
+            attempt += 1
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        """
+        Sends the request, GET requests are conditional if possible.
+        """
+        if method.upper() != 'GET' or self.http_cache is None:
+            return self.send_limited(method, url, params=params,
+                                     headers=headers, **kwargs)
+        full_url = requests.Request('GET', url, params=params).prepare().url
+        key = self.http_cache.key(full_url, self.headers.get('Authorization'))
+        cached = self.http_cache.get(key)
+        headers = dict(headers or {})
+        if cached is not None:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+        response = self.send_limited(method, url, params=params,
+                                     headers=headers, **kwargs)
+        if response.status_code == 304 and cached is not None:
+            return cached_response(response, cached)
+        if response.status_code == 200 and \
+                ('ETag' in response.headers or
+                 'Last-Modified' in response.headers):
+            try:
+                self.http_cache.store(key, response)
+            except UnicodeDecodeError:
+                pass
+        response.from_cache = False
+        return response
+
+
+def cached_response(not_modified, cached):
+    """
+    Builds the response from the cache entry, fresh headers
+    of the 304 response take precedence.
+    """
+    response = requests.Response()
+    response.status_code = 200
+    response.reason = 'OK'
+    response.headers.update(cached['headers'])
+    for name, value in not_modified.headers.items():
+        if not name.lower().startswith('content-'):
+            response.headers[name] = value
+    response.encoding = cached['encoding']
+    response._content = cached['body'].encode('utf-8')
+    response.url = not_modified.url
+    response.request = not_modified.request
+    response.elapsed = not_modified.elapsed
+    response.from_cache = True
+    return response
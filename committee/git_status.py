@@ -0,0 +1,138 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class StatusWriter:
+    """
+    Stage posting commit statuses in background.
+
+    Statuses are queued and posted by at most max_in_flight workers,
+    checking of other commits goes on in the meantime. A status with
+    the same state and description as the one already on Github
+    (known from the status index of the session) is not posted again,
+    the same write queued twice is posted only once.
+
+    Every write ends as 'posted', 'skipped' or 'failed', the counts
+    are reported at the end of the run. SHAs of commits whose status
+    failed are kept in order in failed.
+    """
+    def __init__(self, git_session, max_in_flight=4):
+        self.git_session = git_session
+        self.max_in_flight = max_in_flight
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight)
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.counts = {'posted': 0, 'skipped': 0, 'failed': 0}
+        self.failed = []
+
+    def submit(self, com_context, owner, repo, sha, state, description,
+               target_url=''):
+        """
+        Queues the status, returns a future of (result, response),
+        the response is None for skipped writes.
+        """
+        payload = {'state': state, 'description': description,
+                   'context': com_context, 'target_url': target_url}
+        key = (owner, repo, sha, json.dumps(payload, sort_keys=True))
+        with self.lock:
+            future = self.pending.get(key)
+            if future is None:
+                future = self.executor.submit(self.write, owner, repo, sha,
+                                              payload)
+                self.pending[key] = future
+                future.add_done_callback(
+                    lambda done: self.done(key, done))
+        return future
+
+    def current(self, sha, com_context):
+        """
+        Returns our status of the commit known on Github, or None.
+        """
+        index = self.git_session.status_index
+        if index is None or index.com_context != com_context:
+            return None
+        return index.current(sha)
+
+    def write(self, owner, repo, sha, payload):
+        """
+        Posts the status unless the same one is already set.
+        """
+        current = self.current(sha, payload['context'])
+        if current is not None and \
+                current.get('state', '').lower() == payload['state'] and \
+                current.get('description') == payload['description']:
+            self.count('skipped')
+            return 'skipped', None
+        try:
+            req = self.git_session.post(
+                f'https://api.github.com/repos/{owner}/{repo}/statuses/{sha}',
+                data=json.dumps(payload))
+        except Exception:
+            self.fail(sha)
+            return 'failed', None
+        if req.status_code >= 400:
+            self.fail(sha)
+            return 'failed', req
+        if self.git_session.status_index is not None:
+            self.git_session.status_index.add(sha, [payload])
+        self.count('posted')
+        return 'posted', req
+
+    def done(self, key, future):
+        """
+        Forgets the finished write.
+        """
+        with self.lock:
+            if self.pending.get(key) is future:
+                del self.pending[key]
+
+    def count(self, result):
+        """
+        Counts the result of a write.
+        """
+        with self.lock:
+            self.counts[result] += 1
+
+    def fail(self, sha):
+        """
+        Counts the failed write and remembers its commit.
+        """
+        with self.lock:
+            self.counts['failed'] += 1
+            self.failed.append(sha)
+
+    def failed_since(self, start):
+        """
+        Returns SHAs of commits whose status failed, from the start-th
+        failure on (a count taken before the writes of interest).
+        """
+        with self.lock:
+            return self.failed[start:]
+
+    def flush(self):
+        """
+        Waits for the writes queued so far, returns False if any write
+        of the run failed.
+        """
+        with self.lock:
+            futures = list(self.pending.values())
+        wait(futures)
+        with self.lock:
+            return self.counts['failed'] == 0
+
+    def close(self):
+        """
+        Waits for all queued writes.
+        """
+        self.executor.shutdown(wait=True)
+
+    def report(self):
+        """
+        Returns the counts as a single line of text.
+        """
+        with self.lock:
+            counts = dict(self.counts)
+        return (f"Statuses: {counts['posted']} posted, "
+                f"{counts['skipped']} skipped (unchanged), "
+                f"{counts['failed']} failed")
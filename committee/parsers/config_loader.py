@@ -0,0 +1,127 @@
+import configparser
+import os
+import threading
+import time
+
+from committee.parsers.rule_parser import resolve_config
+from committee.rules.rule_validators import RuleSet, wordlist_path
+from committee.common_errors import err_config_load
+
+
+def read_config(config):
+    """
+    Reads the config file, returns the parser, Github token
+    and committee context.
+    """
+    config_parser = configparser.ConfigParser(allow_no_value=True)
+    with open(config) as f:
+        try:
+            config_parser.read_file(f)
+        except configparser.MissingSectionHeaderError:
+            err_config_load()
+    try:
+        git_token = config_parser.get('github', 'token')
+        com_context = config_parser.get('committee', 'context')
+    except configparser.NoOptionError:
+        err_config_load()
+    except configparser.NoSectionError:
+        err_config_load()
+    return config_parser, git_token, com_context
+
+
+def compile_rules(config_parser, config):
+    """
+    Parses rules of the config into a rule set sorted by rule names.
+    """
+    rule_set = RuleSet()
+    resolve_config(config_parser, config, rule_set)
+    rule_set.sort(key=lambda rule: rule.rule_name)
+    return rule_set
+
+
+def wordlist_files(config, rule_set):
+    """
+    Returns paths of all wordlists used by the rules.
+    """
+    return sorted({wordlist_path(config, rule.match_pattern)
+                   for rule in rule_set
+                   if getattr(rule, 'match_type', None) == 'wordlist'})
+
+
+def file_signature(paths):
+    """
+    Returns inode, mtime and size of the files (None for missing files),
+    the signature changes whenever any of the files is replaced or edited.
+    """
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            signature.append((path, None))
+            continue
+        signature.append((path, stat.st_ino, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class LoadedConfig:
+    """
+    Parsed configuration together with the compiled rule set.
+
+    Sections (without the github secrets) are kept for the website,
+    files are the config and its wordlists.
+    """
+    def __init__(self, config, config_parser, git_token, com_context,
+                 rule_set):
+        self.config = config
+        self.git_token = git_token
+        self.com_context = com_context
+        self.com_secret = config_parser.get('github', 'secret', fallback='')
+        self.rule_set = rule_set
+        self.sections = {name: section for name, section
+                         in config_parser._sections.items()
+                         if name != 'github'}
+        self.files = [config] + wordlist_files(config, rule_set)
+        self.signature = file_signature(self.files)
+
+
+def load_config(config):
+    """
+    Loads the config file and compiles its rules.
+    """
+    config_parser, git_token, com_context = read_config(config)
+    rule_set = compile_rules(config_parser, config)
+    return LoadedConfig(config, config_parser, git_token, com_context,
+                        rule_set)
+
+
+class ConfigCache:
+    """
+    Loaded configurations kept in memory between requests.
+
+    The config is loaded again only when the config file or one of its
+    wordlists changes (files are checked at most once per check_interval
+    seconds), otherwise getting the config is just a lookup.
+    """
+    def __init__(self, check_interval=1.0):
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.configs = {}
+        self.checked = {}
+
+    def get(self, config):
+        """
+        Returns the loaded config, reloads it if any of its files changed.
+        """
+        with self.lock:
+            loaded = self.configs.get(config)
+            now = time.monotonic()
+            if loaded is not None and \
+                    now - self.checked[config] < self.check_interval:
+                return loaded
+            if loaded is None or \
+                    file_signature(loaded.files) != loaded.signature:
+                loaded = load_config(config)
+                self.configs[config] = loaded
+            self.checked[config] = now
+            return loaded
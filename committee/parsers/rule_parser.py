@@ -3,6 +3,7 @@ import re
 import os
 
 from committee.rules.rule_validators import MessageRule, PathRule, StatsRule
+from committee.rules.rule_validators import wordlist_path
 from committee.common_errors import err_config_load
 
 
@@ -17,12 +18,8 @@ def check_validity(config, match_type, match_pattern):
         except re.error:
             err_config_load()
     if match_type == 'wordlist':
-        file_path = match_pattern
-        if not os.path.isabs(file_path):
-            file_path = os.path.join(config[:config.rfind(os.path.sep)],
-                                     file_path)
-            if not os.path.isfile(file_path):
-                err_config_load()
+        if not os.path.isfile(wordlist_path(config, match_pattern)):
+            err_config_load()
 
 
 def get_match(rule_match):
@@ -44,19 +41,21 @@ def get_match(rule_match):
 def resolve_message(config_parser, config, rule_set, section, rule_name,
                     rule_text, rule_type):
     """
-    Parses a single MESSAGE rule and adds it to rule set
+    Parses a single MESSAGE rule and adds it to rule set, 
+    the rule is compiled (wordlist loaded) right away
     """
     rule_match = config_parser.get(section, 'match', fallback=err_config_load)
     match_type, match_pattern = get_match(rule_match)
     check_validity(config, match_type, match_pattern)
     rule_set.append(MessageRule(rule_name, rule_text, rule_type, match_type,
-                    match_pattern))
+                    match_pattern, config))
 
 
 def resolve_path(config_parser, config, rule_set, section, rule_name,
                  rule_text, rule_type):
     """
-    Parses a single PATH rule and adds it to rule set
+    Parses a single PATH rule and adds it to rule set, 
+    the rule is compiled (wordlist loaded) right away
     """
     rule_match = config_parser.get(section, 'match', fallback=err_config_load)
     rule_status = config_parser.get(section, 'status', fallback='*')
@@ -65,7 +64,7 @@ def resolve_path(config_parser, config, rule_set, section, rule_name,
         err_config_load()
     check_validity(config, match_type, match_pattern)
     rule_set.append(PathRule(rule_name, rule_text, rule_type, match_type,
-                    match_pattern, rule_status))
+                    match_pattern, rule_status, config))
 
 
 def resolve_stats(config_parser, rule_set, section, rule_name, rule_text,
@@ -1,20 +1,105 @@
+import functools
+import hashlib
 import re
 import os
+import threading
+import warnings
 import click
 
+from committee.common_output import echo, capture
+from committee.rules.wordlist_matcher import WordlistMatcher
+
 
 def p_fail():
     """
     Print fail helper function.
     """
-    click.echo(click.style('FAIL', fg='red'))
+    echo(click.style('FAIL', fg='red'))
 
 
 def p_pass():
     """
     Print pass helper function.
     """
-    click.echo(click.style('PASS', fg='green'))
+    echo(click.style('PASS', fg='green'))
+
+
+def wordlist_path(config, match_pattern):
+    """
+    Resolves the wordlist path, relative paths are taken from 
+    the config file's directory.
+    """
+    if os.path.isabs(match_pattern):
+        return match_pattern
+    return os.path.join(os.path.dirname(config), match_pattern)
+
+
+def load_wordlist(file_path):
+    """
+    Reads the wordlist (one word per line) into a tuple of lowercased words.
+
+    Empty lines are skipped since they would match everything.
+    """
+    with open(file_path) as f:
+        return tuple(word for word in (line.rstrip('\r\n').lower()
+                                       for line in f) if word)
+
+
+# Relative cost of matching, cheap rules are evaluated first in fast mode
+MATCH_COSTS = {'plain': 1, 'regex': 2, 'wordlist': 3}
+
+
+class PatternMatcher:
+    """
+    Ready-to-match form of a plain, regex or wordlist pattern.
+
+    The regex is compiled and the wordlist is read into 
+    an Aho-Corasick automaton once, when the rule is created, checking 
+    a commit afterwards does no I/O at all.
+    Searched text is expected to be lowercased already.
+    The digest identifies the wordlist contents.
+    """
+    __slots__ = ('match_type', 'plain', 'regex', 'wordlist', 'digest')
+
+    def __init__(self, match_type, match_pattern, config=''):
+        self.match_type = match_type
+        self.plain = None
+        self.regex = None
+        self.wordlist = None
+        self.digest = None
+        if match_type == 'plain':
+            self.plain = match_pattern.lower()
+        elif match_type == 'regex':
+            self.regex = re.compile(match_pattern, re.IGNORECASE)
+        elif match_type == 'wordlist':
+            words = load_wordlist(wordlist_path(config, match_pattern))
+            self.wordlist = WordlistMatcher(words)
+            self.digest = hashlib.sha256(
+                '\n'.join(words).encode()).hexdigest()
+
+    def search(self, text):
+        """
+        Returns True if the (lowercased) text matches the pattern.
+        """
+        if self.match_type == 'plain':
+            return self.plain in text
+        elif self.match_type == 'regex':
+            return self.regex.search(text) is not None
+        elif self.match_type == 'wordlist':
+            return self.wordlist.search(text) is not None
+        return False
+
+    def findall(self, text):
+        """
+        Returns what matched in the (lowercased) text, for wordlists
+        these are all the entries found.
+        """
+        if self.match_type == 'wordlist':
+            return self.wordlist.findall(text)
+        elif self.match_type == 'regex':
+            match = self.regex.search(text)
+            return [match.group(0)] if match else []
+        return [self.plain] if self.search(text) else []
 
 
 class GenericRule:
@@ -23,12 +108,47 @@ class GenericRule:
 
     It contains implementation for shared functionality 
     like printing and rule violation.
+
+    Each rule declares the commit data it needs ('message', 'files' 
+    or 'stats'), commit details are fetched only if some rule needs them.
     """
+    needs = frozenset(('message', 'files', 'stats'))
+    cost = max(MATCH_COSTS.values())
+
     def __init__(self, rule_name, rule_text, rule_type):
         self.rule_name = rule_name
         self.rule_text = rule_text
         self.rule_type = rule_type
 
+    def definition(self):
+        """
+        Returns everything that decides the result of the rule,
+        rules extend it with their own settings.
+        """
+        return (type(self).__name__, self.rule_name, self.rule_text,
+                self.rule_type)
+
+    @property
+    def fingerprint(self):
+        """
+        Content hash of the rule definition (computed once).
+        """
+        try:
+            return self._fingerprint
+        except AttributeError:
+            self._fingerprint = hashlib.sha256(
+                repr(self.definition()).encode()).hexdigest()
+            return self._fingerprint
+
+    def violated(self, commit, file_tree):
+        """
+        Checks only whether the commit violates the rule (nothing is 
+        printed), rules override it to stop at the first violation.
+        """
+        broken_rules = []
+        self.check(commit, 'not-needed-here', broken_rules, 'none', file_tree)
+        return bool(broken_rules)
+
     # Implement checking of the rule against the commit
     def check(self, commit, config, broken_rules, output_format, file_tree):
         """
@@ -43,21 +163,35 @@ class GenericRule:
         Shared functionality for printing the rule.
         """
         if output_format == 'rules':
-            print(f'  -> {self.rule_name}: ', end='')
+            echo(f'  -> {self.rule_name}: ', nl=False)
             if violated:
                 p_fail()
-                print(f'     - {self.rule_text}')
+                echo(f'     - {self.rule_text}')
             else:
                 p_pass()
 
-    def handle_rule_violated(self, broken_rules, violation_files):
+    def handle_rule_violated(self, broken_rules, violation_files, file_name):
         """
-        Shared functionality to check how many times the rule was violated.
+        Shared functionality to record the file violating the rule, 
+        the rule itself is marked as broken only once.
         """
-        if self.violation_count == 0:
+        if not violation_files:
             broken_rules.append(self.rule_name)
-        self.violation_count += 1
-        violation_files.append(self.current_file)
+        violation_files.append(file_name)
+
+    def print_files(self, violation_files, output_format):
+        """
+        Shared functionality for printing the rule together with 
+        all files that violated it.
+        """
+        if output_format == 'rules':
+            echo(f'  -> {self.rule_name}: ', nl=False)
+            if violation_files:
+                p_fail()
+                for wrong_file in violation_files:
+                    echo(f'     - {wrong_file}: {self.rule_text}')
+            else:
+                p_pass()
 
 
 class MessageRule(GenericRule):
@@ -76,11 +210,38 @@ class MessageRule(GenericRule):
         output_format = 'rules'
         rule.check(commit, 'not-needed-here', broken_rules, output_format, 'not-needed-here')
     """
+    needs = frozenset(('message',))
+
     def __init__(self, rule_name, rule_text, rule_type, match_type,
-                 match_pattern):
+                 match_pattern, config=''):
         super().__init__(rule_name, rule_text, rule_type)
         self.match_type = match_type
         self.match_pattern = match_pattern
+        self.matcher = PatternMatcher(match_type, match_pattern, config)
+
+    @property
+    def cost(self):
+        """
+        Relative cost of the match type.
+        """
+        return MATCH_COSTS[self.match_type]
+
+    def definition(self):
+        """
+        Adds the pattern (and wordlist contents) to the definition.
+        """
+        return super().definition() + (self.match_type, self.match_pattern,
+                                       self.matcher.digest)
+
+    def violated(self, commit, file_tree):
+        """
+        Checks if the commit message violates the rule.
+        """
+        try:
+            message = commit['commit']['message'].lower()
+        except KeyError:
+            message = commit['message'].lower()
+        return self.matcher.search(message)
 
     def handle_rule_violated(self, broken_rules, rule_violated, output_format):
         """
@@ -99,28 +260,8 @@ class MessageRule(GenericRule):
             message = commit['commit']['message'].lower()
         except KeyError:
             message = commit['message'].lower()
-        if self.match_type == 'plain':
-            rule_violated = self.match_pattern.lower() in message
-            self.handle_rule_violated(broken_rules, rule_violated,
-                                      output_format)
-        elif self.match_type == 'regex':
-            pattern = re.compile(self.match_pattern, re.IGNORECASE)
-            rule_violated = pattern.search(message)
-            self.handle_rule_violated(broken_rules, rule_violated,
-                                      output_format)
-        elif self.match_type == 'wordlist':
-            file_path = self.match_pattern
-            if not os.path.isabs(file_path):
-                file_path = os.path.join(config[:config.rfind(os.path.sep)],
-                                         file_path)
-            with open(file_path) as f:
-                for line in f.readlines():
-                    rule_violated = line[:line.rfind(os.linesep)].lower() \
-                                    in message
-                    if rule_violated:
-                        broken_rules.append(self.rule_name)
-                        break
-                self.print(rule_violated, output_format)
+        rule_violated = self.matcher.search(message)
+        self.handle_rule_violated(broken_rules, rule_violated, output_format)
 
 
 class PathRule(GenericRule):
@@ -152,64 +293,169 @@ class PathRule(GenericRule):
         output_format = 'rules'
         rule.check('not-needed-here', 'not-needed-here', broken_rules, output_format, file_tree)
     """
+    needs = frozenset(('files',))
+
     def __init__(self, rule_name, rule_text, rule_type, match_type,
-                 match_pattern, rule_status):
+                 match_pattern, rule_status, config=''):
         super().__init__(rule_name, rule_text, rule_type)
         self.match_type = match_type
         self.match_pattern = match_pattern
         self.rule_status = rule_status
-        self.current_file = ''
-        self.violation_count = 0
+        self.matcher = PatternMatcher(match_type, match_pattern, config)
+
+    @property
+    def cost(self):
+        """
+        Relative cost of the match type.
+        """
+        return MATCH_COSTS[self.match_type]
+
+    def definition(self):
+        """
+        Adds the pattern (and wordlist contents) and file status 
+        to the definition.
+        """
+        return super().definition() + (self.match_type, self.match_pattern,
+                                       self.matcher.digest, self.rule_status)
+
+    def violated(self, commit, file_tree):
+        """
+        Checks files until the first one violating the rule.
+        """
+        for entry in file_tree['files']:
+            if self.rule_status == '*' or self.rule_status == entry['status']:
+                if self.matcher.search(entry['filename'].lower()):
+                    return True
+        return False
 
-    def pcheck(self, config, broken_rules, output_format, message,
-               violation_files):
+    def pcheck(self, broken_rules, message, violation_files, file_name):
         """
         Helper function to check if single item violated the rule.
         """
-        if self.match_type == 'plain':
-            rule_violated = self.match_pattern.lower() in message
-            if rule_violated:
-                self.handle_rule_violated(broken_rules, violation_files)
-        elif self.match_type == 'regex':
-            pattern = re.compile(self.match_pattern, re.IGNORECASE)
-            match = pattern.search(message)
-            if match:
-                self.handle_rule_violated(broken_rules, violation_files)
-        elif self.match_type == 'wordlist':
-            file_path = self.match_pattern
-            if not os.path.isabs(file_path):
-                file_path = os.path.join(config[:config.rfind(os.path.sep)],
-                                         file_path)
-            with open(file_path) as f:
-                for line in f.readlines():
-                    rule_violated = line[:line.rfind(os.linesep)].lower() \
-                                    in message
-                    if rule_violated:
-                        self.handle_rule_violated(broken_rules,
-                                                  violation_files)
-                        break
+        if self.matcher.search(message):
+            self.handle_rule_violated(broken_rules, violation_files,
+                                      file_name)
 
     def check(self, commit, config, broken_rules, output_format, file_tree):
         """
         Checks for all violations against this rule and prints them out.
         """
         violation_files = []
-        self.violation_count = 0
         for entry in file_tree['files']:
             file_state = entry['status']
             if self.rule_status == '*' or self.rule_status == file_state:
-                self.current_file = entry['filename']
-                message = entry['filename'].lower()
-                self.pcheck(config, broken_rules, output_format, message,
-                            violation_files)
-        if output_format == 'rules':
-            print(f'  -> {self.rule_name}: ', end='')
-            if self.violation_count > 0:
-                p_fail()
-                for wrong_file in violation_files:
-                    print(f'     - {wrong_file}: {self.rule_text}')
+                self.pcheck(broken_rules, entry['filename'].lower(),
+                            violation_files, entry['filename'])
+        self.print_files(violation_files, output_format)
+
+    def report(self, broken_rules, violation_files, output_format):
+        """
+        Records and prints violations found by the PathRuleEvaluator.
+        """
+        if violation_files:
+            broken_rules.append(self.rule_name)
+        self.print_files(violation_files, output_format)
+
+
+class PathRuleEvaluator:
+    """
+    Evaluates all path rules over the commit's files in a single pass.
+
+    Every filename is lowercased only once. Plain and simple regex rules 
+    applicable to the same file status are fused into one alternation 
+    regex, a file that does not match it is skipped for all of them 
+    at once. Wordlist rules and regexes that cannot be fused (groups,
+    inline flags) are checked one by one.
+    """
+    def __init__(self, path_rules):
+        self.rules = tuple(path_rules)
+        self.sources = tuple(self.fusable(rule) for rule in self.rules)
+        self.buckets = {}
+
+    def fusable(self, rule):
+        """
+        Returns the regex source of the rule if it can be fused, else None.
+        """
+        matcher = rule.matcher
+        if matcher.match_type == 'plain':
+            return re.escape(matcher.plain)
+        if matcher.match_type != 'regex' or matcher.regex.groups != 0:
+            return None
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error')
+                re.compile(f'(?!)|(?:{matcher.regex.pattern})')
+        except (re.error, DeprecationWarning):
+            return None
+        return matcher.regex.pattern
+
+    def bucket(self, file_state):
+        """
+        Returns (prefilter, fused, other) rule indexes for the file status, 
+        buckets are built on first use and reused afterwards.
+        """
+        try:
+            return self.buckets[file_state]
+        except KeyError:
+            pass
+        fused = []
+        sources = []
+        other = []
+        for index, rule in enumerate(self.rules):
+            if rule.rule_status != '*' and rule.rule_status != file_state:
+                continue
+            source = self.sources[index]
+            if source is None:
+                other.append(index)
             else:
-                p_pass()
+                fused.append(index)
+                sources.append(f'(?P<r{index}>{source})')
+        other.sort(key=lambda index: self.rules[index].cost)
+        prefilter = None
+        if sources:
+            prefilter = re.compile('|'.join(sources), re.IGNORECASE)
+        self.buckets[file_state] = (prefilter, tuple(fused), tuple(other))
+        return self.buckets[file_state]
+
+    def evaluate(self, file_tree):
+        """
+        Returns the list of violating files for each rule (in rule order).
+        """
+        violations = [[] for _ in self.rules]
+        for entry in file_tree['files']:
+            file_name = entry['filename']
+            message = file_name.lower()
+            prefilter, fused, other = self.bucket(entry['status'])
+            if fused and prefilter.search(message):
+                for index in fused:
+                    if self.rules[index].matcher.search(message):
+                        violations[index].append(file_name)
+            for index in other:
+                if self.rules[index].matcher.search(message):
+                    violations[index].append(file_name)
+        return violations
+
+    def violated(self, file_tree):
+        """
+        Returns indexes of the violated rules. Files are scanned only 
+        until all rules are violated, violated rules are not searched again.
+        """
+        violated = set()
+        for entry in file_tree['files']:
+            if len(violated) == len(self.rules):
+                break
+            message = entry['filename'].lower()
+            prefilter, fused, other = self.bucket(entry['status'])
+            pending = [index for index in fused if index not in violated]
+            if pending and prefilter.search(message):
+                for index in pending:
+                    if self.rules[index].matcher.search(message):
+                        violated.add(index)
+            for index in other:
+                if index not in violated and \
+                        self.rules[index].matcher.search(message):
+                    violated.add(index)
+        return violated
 
 
 class StatsRule(GenericRule):
@@ -235,8 +481,42 @@ class StatsRule(GenericRule):
         self.rule_scope = rule_scope
         self.rule_min = int(rule_min)
         self.rule_max = int(rule_max)
-        self.current_file = ''
-        self.violation_count = 0
+
+    cost = 0
+
+    @property
+    def needs(self):
+        """
+        Commit scope needs commit stats, file scope needs the files.
+        """
+        if self.rule_scope == 'commit':
+            return frozenset(('stats',))
+        return frozenset(('files',))
+
+    def definition(self):
+        """
+        Adds the checked stat, scope and range to the definition.
+        """
+        return super().definition() + (self.rule_stat, self.rule_scope,
+                                        self.rule_min, self.rule_max)
+
+    def out_of_range(self, check_value):
+        """
+        Checks if the value is outside of the allowed range.
+        """
+        return ((check_value > self.rule_max and self.rule_max != -1)
+                or check_value < self.rule_min)
+
+    def violated(self, commit, file_tree):
+        """
+        Checks the commit stats, or files until the first violating one.
+        """
+        if self.rule_scope == 'commit':
+            return self.out_of_range(int(file_tree['stats'][self.rule_stat]))
+        elif self.rule_scope == 'file':
+            return any(self.out_of_range(entry[self.rule_stat])
+                       for entry in file_tree['files'])
+        return False
 
     def check_commit(self, commit, config, broken_rules, output_format,
                      file_tree):
@@ -244,8 +524,7 @@ class StatsRule(GenericRule):
         Helper method to check if commit has correct stats.
         """
         check_value = int(file_tree['stats'][self.rule_stat])
-        rule_violated = ((check_value > self.rule_max and self.rule_max != -1)
-                         or check_value < self.rule_min)
+        rule_violated = self.out_of_range(check_value)
         if rule_violated:
             broken_rules.append(self.rule_name)
         self.print(rule_violated, output_format)
@@ -256,20 +535,16 @@ class StatsRule(GenericRule):
         Helper method to check if file has correct stats.
         """
         for entry in file_tree['files']:
-            check_value = entry[self.rule_stat]
-            self.current_file = entry['filename']
-            rule_violated = ((check_value > self.rule_max and
-                             self.rule_max != -1)
-                             or check_value < self.rule_min)
+            rule_violated = self.out_of_range(entry[self.rule_stat])
             if rule_violated:
-                self.handle_rule_violated(broken_rules, violation_files)
+                self.handle_rule_violated(broken_rules, violation_files,
+                                          entry['filename'])
 
     def check(self, commit, config, broken_rules, output_format, file_tree):
         """
         Checks if file or commit has correct stats by calling the helper methods
         and prints the result.
         """
-        self.violation_count = 0
         violation_files = []
         if self.rule_scope == 'commit':
             self.check_commit(commit, config, broken_rules, output_format,
@@ -277,11 +552,117 @@ class StatsRule(GenericRule):
         elif self.rule_scope == 'file':
             self.check_file(commit, config, broken_rules, output_format,
                             file_tree, violation_files)
-            if output_format == 'rules':
-                print(f'  -> {self.rule_name}: ', end='')
-                if self.violation_count > 0:
-                    p_fail()
-                    for wrong_file in violation_files:
-                        print(f'     - {wrong_file}: {self.rule_text}')
+            self.print_files(violation_files, output_format)
+
+
+evaluators_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=64)
+def cached_evaluator(path_rules):
+    """
+    Builds the evaluator of the path rules, kept for the same rules.
+    """
+    return PathRuleEvaluator(path_rules)
+
+
+def path_evaluator(path_rules):
+    """
+    Returns the evaluator of the path rules, shared by all rule sets
+    with the same rules (evaluators are built by one thread at a time).
+    """
+    with evaluators_lock:
+        return cached_evaluator(path_rules)
+
+
+class RuleSet(list):
+    """
+    The rule set, rules are checked (and printed) in the list order.
+
+    All path rules are evaluated together by PathRuleEvaluator, 
+    the results are then reported by each rule at its own position.
+    """
+    def __init__(self, rules=()):
+        super().__init__(rules)
+        self.evaluator = None
+
+    def path_evaluator(self):
+        """
+        Returns the evaluator for the current path rules, it is rebuilt 
+        only when the rules in the set change.
+        """
+        path_rules = tuple(rule for rule in self if rule.rule_type == 'path')
+        if self.evaluator is None or self.evaluator.rules != path_rules:
+            self.evaluator = path_evaluator(path_rules)
+        return self.evaluator
+
+    def needs(self):
+        """
+        Returns the commit data needed by any rule in the set.
+        """
+        return frozenset().union(*(rule.needs for rule in self))
+
+    def broken(self, commit, file_tree):
+        """
+        Returns names of the broken rules (in the set order) without 
+        printing anything. Cheap rules are evaluated first and every rule 
+        stops at its first violation.
+        """
+        violated = set()
+        for rule in sorted((rule for rule in self
+                            if rule.rule_type != 'path'),
+                           key=lambda rule: rule.cost):
+            if rule.violated(commit, file_tree):
+                violated.add(rule)
+        evaluator = self.path_evaluator()
+        if evaluator.rules:
+            violated.update(evaluator.rules[index]
+                            for index in evaluator.violated(file_tree))
+        return [rule.rule_name for rule in self if rule in violated]
+
+    def verdicts(self, commit, config, output_format, file_tree):
+        """
+        Returns (violated, output) of every rule in the set order, 
+        output is the captured print of the rule (None in fast mode).
+        """
+        if output_format != 'rules':
+            broken_rules = set(self.broken(commit, file_tree))
+            return [(rule.rule_name in broken_rules, None) for rule in self]
+        evaluator = self.path_evaluator()
+        path_violations = {}
+        if evaluator.rules:
+            path_violations = dict(zip(evaluator.rules,
+                                       evaluator.evaluate(file_tree)))
+        verdicts = []
+        for rule in self:
+            broken_rules = []
+            with capture() as output:
+                if rule.rule_type == 'path':
+                    rule.report(broken_rules, path_violations[rule],
+                                output_format)
                 else:
-                    p_pass()
+                    rule.check(commit, config, broken_rules, output_format,
+                               file_tree)
+            verdicts.append((bool(broken_rules), output))
+        return verdicts
+
+    def check(self, commit, config, broken_rules, output_format, file_tree):
+        """
+        Checks the commit against all rules in the set. Unless the rules 
+        are printed, only the broken rules are found (fast mode).
+        """
+        if output_format != 'rules':
+            broken_rules.extend(self.broken(commit, file_tree))
+            return
+        evaluator = self.path_evaluator()
+        path_violations = {}
+        if evaluator.rules:
+            path_violations = dict(zip(evaluator.rules,
+                                       evaluator.evaluate(file_tree)))
+        for rule in self:
+            if rule.rule_type == 'path':
+                rule.report(broken_rules, path_violations[rule],
+                            output_format)
+            else:
+                rule.check(commit, config, broken_rules, output_format,
+                           file_tree)
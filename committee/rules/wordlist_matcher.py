@@ -0,0 +1,105 @@
+from collections import deque
+
+
+class WordlistMatcher:
+    """
+    Aho-Corasick automaton built from a wordlist.
+
+    All words are matched in a single pass over the text, so the cost
+    of a check depends on the text length and not on the wordlist size.
+
+    The matcher is used like this:
+
+    .. code::
+
+        matcher = WordlistMatcher(['foo', 'bar', 'oba'])
+        matcher.search('xfoobar')   # 'foo'
+        matcher.findall('xfoobar')  # ['foo', 'oba', 'bar']
+    """
+    __slots__ = ('words', 'goto', 'fail', 'output', 'dict_link')
+
+    def __init__(self, words):
+        self.words = tuple(words)
+        self.goto = [{}]
+        self.output = [-1]
+        for index, word in enumerate(self.words):
+            self.add_word(index, word)
+        self.fail = [0] * len(self.goto)
+        self.dict_link = [0] * len(self.goto)
+        self.build_links()
+
+    def add_word(self, index, word):
+        """
+        Adds the word into the trie, duplicate words keep the first index.
+        """
+        state = 0
+        for char in word:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.output.append(-1)
+            state = next_state
+        if self.output[state] == -1:
+            self.output[state] = index
+
+    def build_links(self):
+        """
+        Computes failure links and dictionary suffix links (breadth-first).
+        """
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target
+                if self.output[target] != -1:
+                    self.dict_link[next_state] = target
+                else:
+                    self.dict_link[next_state] = self.dict_link[target]
+
+    def scan(self, text):
+        """
+        Yields indexes of the words found in the text, in order of
+        the position where they end.
+        """
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        dict_link = self.dict_link
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state] != -1:
+                yield output[state]
+            match = dict_link[state]
+            while match:
+                yield output[match]
+                match = dict_link[match]
+
+    def search(self, text):
+        """
+        Returns the first word found in the text or None.
+        """
+        for index in self.scan(text):
+            return self.words[index]
+        return None
+
+    def findall(self, text):
+        """
+        Returns all distinct words found in the text.
+        """
+        found = []
+        seen = set()
+        for index in self.scan(text):
+            if index not in seen:
+                seen.add(index)
+                found.append(self.words[index])
+        return found
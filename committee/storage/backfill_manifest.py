@@ -0,0 +1,200 @@
+import time
+
+from committee.storage.sqlite_store import SqliteStore
+
+
+class BackfillManifest(SqliteStore):
+    """
+    Work manifest of sharded backfills.
+
+    A backfill checks the history of a repository pinned to its head SHA,
+    so pages of the history do not move while it runs. The pages are
+    split into shards (ranges of pages), workers (threads, processes
+    or machines sharing the file) claim shards with a lease and record
+    the next page to check after every page. A shard of a worker that
+    crashed is claimed again once its lease expires and continues from
+    the recorded page. Commits whose status could not be written are
+    recorded as failures of the backfill and checking moves on. Once
+    all shards are done, a backfill of a newer head replaces the
+    finished one.
+
+    Workers on other machines share the file over a network filesystem,
+    so the manifest uses the rollback journal (relying on file locks)
+    instead of WAL, which is safe only for processes of one host.
+    """
+    journal_mode = 'DELETE'
+    schema = '''
+        CREATE TABLE IF NOT EXISTS backfills (
+            id INTEGER PRIMARY KEY,
+            reposlug TEXT NOT NULL,
+            ref TEXT NOT NULL,
+            context TEXT NOT NULL,
+            author TEXT NOT NULL,
+            path TEXT NOT NULL,
+            head_sha TEXT NOT NULL,
+            newest_sha TEXT,
+            pages INTEGER NOT NULL,
+            created REAL NOT NULL,
+            UNIQUE (reposlug, ref, context, author, path)
+        );
+        CREATE TABLE IF NOT EXISTS shards (
+            backfill INTEGER NOT NULL,
+            number INTEGER NOT NULL,
+            first_page INTEGER NOT NULL,
+            stop_page INTEGER NOT NULL,
+            next_page INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            worker TEXT,
+            lease REAL NOT NULL,
+            PRIMARY KEY (backfill, number)
+        );
+        CREATE TABLE IF NOT EXISTS failures (
+            backfill INTEGER NOT NULL,
+            sha TEXT NOT NULL,
+            PRIMARY KEY (backfill, sha)
+        );
+    '''
+
+    def find(self, reposlug, ref, context, author, path):
+        """
+        Returns the backfill as a dictionary, or None if it is not planned.
+        """
+        rows = self.execute('SELECT id, head_sha, newest_sha, pages '
+                            'FROM backfills '
+                            'WHERE reposlug = ? AND ref = ? AND context = ? '
+                            'AND author = ? AND path = ?',
+                            (reposlug, ref or '', context, author or '',
+                             path or ''))
+        if not rows:
+            return None
+        backfill_id, head_sha, newest_sha, pages = rows[0]
+        return {'id': backfill_id, 'head_sha': head_sha,
+                'newest_sha': newest_sha, 'pages': pages}
+
+    def plan(self, reposlug, ref, context, author, path, head_sha,
+             newest_sha, pages, shard_pages):
+        """
+        Creates the backfill with its shards, returns the backfill
+        (the existing one if another worker planned it first).
+        A finished backfill of another head is replaced by the new one.
+        The newest SHA is the first commit of the (filtered) history.
+        """
+        key = (reposlug, ref or '', context, author or '', path or '')
+        with self.transaction() as connection:
+            row = connection.execute(
+                'SELECT id, head_sha FROM backfills WHERE reposlug = ? '
+                'AND ref = ? AND context = ? AND author = ? AND path = ?',
+                key).fetchone()
+            if row is not None and row[1] != head_sha and \
+                    self.finished(connection, row[0]):
+                connection.execute('DELETE FROM shards WHERE backfill = ?',
+                                   (row[0],))
+                connection.execute('DELETE FROM failures WHERE backfill = ?',
+                                   (row[0],))
+                connection.execute('DELETE FROM backfills WHERE id = ?',
+                                   (row[0],))
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO backfills (reposlug, ref, context, '
+                'author, path, head_sha, newest_sha, pages, created) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                key + (head_sha, newest_sha, pages, time.time()))
+            if cursor.rowcount:
+                connection.executemany(
+                    'INSERT INTO shards (backfill, number, first_page, '
+                    'stop_page, next_page, state, worker, lease) '
+                    'VALUES (?, ?, ?, ?, ?, \'pending\', NULL, 0)',
+                    [(cursor.lastrowid, number, first,
+                      min(first + shard_pages, pages + 1), first)
+                     for number, first
+                     in enumerate(range(1, pages + 1, shard_pages))])
+        return self.find(reposlug, ref, context, author, path)
+
+    @staticmethod
+    def finished(connection, backfill_id):
+        """
+        Checks if all shards of the backfill are done.
+        """
+        return connection.execute('SELECT COUNT(*) FROM shards WHERE '
+                                  'backfill = ? AND state != \'done\'',
+                                  (backfill_id,)).fetchone()[0] == 0
+
+    def shards(self, backfill_id):
+        """
+        Returns all shards of the backfill (from their first page),
+        without claiming them.
+        """
+        return [{'number': number, 'first_page': first_page,
+                 'stop_page': stop_page, 'next_page': first_page}
+                for number, first_page, stop_page
+                in self.execute('SELECT number, first_page, stop_page '
+                                'FROM shards WHERE backfill = ? '
+                                'ORDER BY number', (backfill_id,))]
+
+    def claim(self, backfill_id, worker, lease_time):
+        """
+        Claims the first waiting shard (or a shard with expired lease),
+        returns it as a dictionary or None when there is none.
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            row = connection.execute(
+                'SELECT number, first_page, stop_page, next_page '
+                'FROM shards WHERE backfill = ? AND (state = \'pending\' OR '
+                '(state = \'running\' AND lease < ?)) ORDER BY number '
+                'LIMIT 1', (backfill_id, now)).fetchone()
+            if row is None:
+                return None
+            connection.execute('UPDATE shards SET state = \'running\', '
+                               'worker = ?, lease = ? WHERE backfill = ? '
+                               'AND number = ?',
+                               (worker, now + lease_time, backfill_id,
+                                row[0]))
+        number, first_page, stop_page, next_page = row
+        return {'number': number, 'first_page': first_page,
+                'stop_page': stop_page, 'next_page': next_page}
+
+    def checkpoint(self, backfill_id, number, worker, next_page, lease_time,
+                   failed=()):
+        """
+        Records the next page of the shard together with SHAs of commits
+        whose status failed on the checked pages and renews the lease,
+        returns False if the shard was claimed by another worker meanwhile.
+        """
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                'UPDATE shards SET next_page = ?, lease = ? '
+                'WHERE backfill = ? AND number = ? AND worker = ? '
+                'AND state = \'running\'',
+                (next_page, time.time() + lease_time, backfill_id, number,
+                 worker))
+            if cursor.rowcount != 1:
+                return False
+            connection.executemany('INSERT OR IGNORE INTO failures '
+                                   '(backfill, sha) VALUES (?, ?)',
+                                   [(backfill_id, sha) for sha in failed])
+            return True
+
+    def finish(self, backfill_id, number, worker):
+        """
+        Marks the shard as done (if it is still held by the worker).
+        """
+        self.execute('UPDATE shards SET state = \'done\', '
+                     'next_page = stop_page WHERE backfill = ? '
+                     'AND number = ? AND worker = ?',
+                     (backfill_id, number, worker))
+
+    def failures(self, backfill_id):
+        """
+        Returns SHAs of commits of the backfill whose status failed.
+        """
+        return [sha for sha, in self.execute('SELECT sha FROM failures '
+                                             'WHERE backfill = ? '
+                                             'ORDER BY sha', (backfill_id,))]
+
+    def progress(self, backfill_id):
+        """
+        Returns numbers of done and all shards of the backfill.
+        """
+        return self.execute('SELECT COUNT(CASE WHEN state = \'done\' '
+                            'THEN 1 END), COUNT(*) FROM shards '
+                            'WHERE backfill = ?', (backfill_id,))[0]
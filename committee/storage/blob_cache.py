@@ -0,0 +1,145 @@
+import json
+import time
+import zlib
+
+from committee.storage.sqlite_store import SqliteStore
+
+
+class BlobCache(SqliteStore):
+    """
+    Size limited cache of compressed JSON values.
+
+    When the cache grows over max_bytes, least recently used entries
+    are evicted. The total size of the entries is kept in a meta table
+    and updated with every write, so processes sharing the file agree
+    on it without summing the whole table. Subclasses only choose
+    the table name.
+    """
+    table = 'entries'
+
+    def __init__(self, path, max_bytes):
+        self.schema = f'''
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                payload BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS {self.table}_used
+                ON {self.table} (used);
+            CREATE TABLE IF NOT EXISTS {self.table}_meta (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                total INTEGER NOT NULL
+            );
+        '''
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        with self.transaction() as connection:
+            connection.execute(f'INSERT OR IGNORE INTO {self.table}_meta '
+                               '(id, total) SELECT 0, COALESCE(SUM(size), 0) '
+                               f'FROM {self.table}')
+
+    def get(self, key):
+        """
+        Returns the cached value or None.
+        """
+        rows = self.execute(f'SELECT payload FROM {self.table} WHERE key = ?',
+                            (key,))
+        if not rows:
+            return None
+        self.execute(f'UPDATE {self.table} SET used = ? WHERE key = ?',
+                     (time.time(), key))
+        return json.loads(zlib.decompress(rows[0][0]).decode())
+
+    def put(self, key, value):
+        """
+        Stores the value and evicts old entries if needed.
+        """
+        payload = zlib.compress(json.dumps(value).encode())
+        with self.transaction() as connection:
+            total = self.replace_entry(connection, self.total(connection),
+                                       key, payload)
+            if total > self.max_bytes:
+                total = self.evict(connection, total)
+            self.set_total(connection, total)
+
+    def get_many(self, keys):
+        """
+        Returns cached values of the keys that are present.
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        placeholders = ', '.join('?' * len(keys))
+        with self.transaction() as connection:
+            rows = connection.execute(f'SELECT key, payload FROM {self.table} '
+                                      f'WHERE key IN ({placeholders})',
+                                      keys).fetchall()
+            connection.executemany(f'UPDATE {self.table} SET used = ? '
+                                   'WHERE key = ?',
+                                   [(time.time(), key) for key, _ in rows])
+        return {key: json.loads(zlib.decompress(payload).decode())
+                for key, payload in rows}
+
+    def put_many(self, items):
+        """
+        Stores all values in one transaction and evicts old entries
+        if needed.
+        """
+        rows = [(key, zlib.compress(json.dumps(value).encode()))
+                for key, value in items.items()]
+        with self.transaction() as connection:
+            total = self.total(connection)
+            for key, payload in rows:
+                total = self.replace_entry(connection, total, key, payload)
+            if total > self.max_bytes:
+                total = self.evict(connection, total)
+            self.set_total(connection, total)
+
+    def total(self, connection):
+        """
+        Returns the total size of the entries.
+        """
+        return connection.execute(f'SELECT total FROM {self.table}_meta '
+                                  'WHERE id = 0').fetchone()[0]
+
+    def set_total(self, connection, total):
+        """
+        Records the total size of the entries.
+        """
+        connection.execute(f'UPDATE {self.table}_meta SET total = ? '
+                           'WHERE id = 0', (total,))
+
+    def replace_entry(self, connection, total, key, payload):
+        """
+        Inserts or replaces the entry, returns the new total size
+        (the size of the replaced entry is subtracted).
+        """
+        row = connection.execute(f'SELECT size FROM {self.table} '
+                                 'WHERE key = ?', (key,)).fetchone()
+        if row is not None:
+            total -= row[0]
+        connection.execute(f'INSERT OR REPLACE INTO {self.table} '
+                           '(key, payload, size, used) VALUES (?, ?, ?, ?)',
+                           (key, payload, len(payload), time.time()))
+        return total + len(payload)
+
+    def evict(self, connection, total, batch_size=100):
+        """
+        Deletes least recently used entries until the cache fits max_bytes
+        (entries are read in batches, only as many as are deleted),
+        returns the new total size.
+        """
+        while total > self.max_bytes:
+            rows = connection.execute(f'SELECT key, size FROM {self.table} '
+                                      'ORDER BY used LIMIT ?',
+                                      (batch_size,)).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                connection.execute(f'DELETE FROM {self.table} WHERE key = ?',
+                                   (key,))
+                total -= size
+        return total
@@ -0,0 +1,12 @@
+from committee.storage.blob_cache import BlobCache
+
+
+class CommitCache(BlobCache):
+    """
+    Persistent cache of commit details (the /commits/{sha} payload),
+    keyed by the commit SHA.
+
+    Commit contents never change for a given SHA, so entries never expire,
+    they are only evicted when the cache is full.
+    """
+    table = 'commits'
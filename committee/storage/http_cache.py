@@ -0,0 +1,33 @@
+import hashlib
+
+from committee.storage.blob_cache import BlobCache
+
+
+class HttpCache(BlobCache):
+    """
+    Cache of GET responses with ETag or Last-Modified validators.
+
+    Entries are keyed by the request URL and a hash of the token, 
+    so responses are never shared between different Github accounts.
+    """
+    table = 'responses'
+
+    def key(self, url, authorization):
+        """
+        Returns the cache key of the request.
+        """
+        token = hashlib.sha256((authorization or '').encode()).hexdigest()
+        return f'{token[:16]} {url}'
+
+    def store(self, key, response):
+        """
+        Stores the response together with its validators.
+        """
+        self.put(key, {'etag': response.headers.get('ETag'),
+                       'last_modified': response.headers.get('Last-Modified'),
+                       'headers': {name: value for name, value
+                                   in response.headers.items()
+                                   if name.lower() not in ('content-length',
+                                                           'content-encoding')},
+                       'encoding': response.encoding,
+                       'body': response.content.decode('utf-8')})
@@ -0,0 +1,132 @@
+import json
+import time
+
+from committee.storage.sqlite_store import SqliteStore
+
+
+class JobQueue(SqliteStore):
+    """
+    Persistent queue of commits from webhook deliveries.
+
+    There is one job per commit SHA, a delivery with a commit that is
+    already waiting (or being checked) is coalesced into the existing job.
+    Claimed jobs hold a lease, jobs of a worker that died (or of a server
+    that was restarted) are claimed again once their lease expires.
+    Failed jobs are retried until max_attempts is reached.
+    """
+    schema = '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            sha TEXT PRIMARY KEY,
+            reposlug TEXT NOT NULL,
+            config TEXT NOT NULL,
+            target_url TEXT NOT NULL,
+            commit_json TEXT NOT NULL,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            enqueued REAL NOT NULL,
+            lease REAL NOT NULL,
+            finished REAL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_state
+            ON jobs (state, enqueued);
+    '''
+    max_attempts = 3
+    keep_finished = 24 * 60 * 60
+
+    def enqueue(self, reposlug, config, target_url, commits):
+        """
+        Adds jobs for the commits, returns numbers of queued
+        and coalesced commits.
+        """
+        queued = coalesced = 0
+        now = time.time()
+        with self.transaction() as connection:
+            for commit in commits:
+                row = connection.execute('SELECT state FROM jobs '
+                                         'WHERE sha = ?',
+                                         (commit['id'],)).fetchone()
+                if row is not None and row[0] in ('pending', 'running'):
+                    coalesced += 1
+                    continue
+                connection.execute('INSERT OR REPLACE INTO jobs (sha, '
+                                   'reposlug, config, target_url, '
+                                   'commit_json, state, attempts, enqueued, '
+                                   'lease, finished) VALUES (?, ?, ?, ?, ?, '
+                                   '\'pending\', 0, ?, 0, NULL)',
+                                   (commit['id'], reposlug, config,
+                                    target_url, json.dumps(commit), now))
+                queued += 1
+        return queued, coalesced
+
+    def claim(self, limit, lease_time):
+        """
+        Claims up to limit oldest waiting jobs (and jobs with expired lease),
+        returns them as dictionaries. A job whose lease expired after its
+        last attempt (its worker died every time) is marked as failed.
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            connection.execute('UPDATE jobs SET state = \'failed\', '
+                               'finished = ? WHERE state = \'running\' '
+                               'AND lease < ? AND attempts >= ?',
+                               (now, now, self.max_attempts))
+            rows = connection.execute(
+                'SELECT sha, reposlug, config, target_url, commit_json, '
+                'enqueued FROM jobs WHERE state = \'pending\' OR '
+                '(state = \'running\' AND lease < ?) ORDER BY enqueued '
+                'LIMIT ?', (now, limit)).fetchall()
+            connection.executemany('UPDATE jobs SET state = \'running\', '
+                                   'attempts = attempts + 1, lease = ? '
+                                   'WHERE sha = ?',
+                                   [(now + lease_time, row[0])
+                                    for row in rows])
+        return [{'sha': sha, 'reposlug': reposlug, 'config': config,
+                 'target_url': target_url, 'commit': json.loads(commit_json),
+                 'enqueued': enqueued}
+                for sha, reposlug, config, target_url, commit_json, enqueued
+                in rows]
+
+    def finish(self, shas, failed=False):
+        """
+        Marks the jobs as done, failed jobs go back to the queue
+        unless they ran out of attempts.
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            for sha in shas:
+                if failed:
+                    connection.execute(
+                        'UPDATE jobs SET state = CASE WHEN attempts < ? '
+                        'THEN \'pending\' ELSE \'failed\' END, lease = 0, '
+                        'finished = ? WHERE sha = ?',
+                        (self.max_attempts, now, sha))
+                else:
+                    connection.execute('UPDATE jobs SET state = \'done\', '
+                                       'finished = ? WHERE sha = ?',
+                                       (now, sha))
+            connection.execute('DELETE FROM jobs WHERE state IN (\'done\', '
+                               '\'failed\') AND finished < ?',
+                               (now - self.keep_finished,))
+
+    def stats(self):
+        """
+        Returns queue depth (waiting and running jobs), age of the oldest
+        waiting job and average latency (enqueue to finish) of the last
+        hundred finished jobs, in seconds.
+        """
+        now = time.time()
+        counts = dict(self.execute('SELECT state, COUNT(*) FROM jobs '
+                                   'GROUP BY state'))
+        oldest = self.execute('SELECT MIN(enqueued) FROM jobs '
+                              'WHERE state = \'pending\'')[0][0]
+        latency = self.execute('SELECT AVG(finished - enqueued) FROM '
+                               '(SELECT finished, enqueued FROM jobs '
+                               'WHERE state = \'done\' '
+                               'ORDER BY finished DESC LIMIT 100)')[0][0]
+        return {'pending': counts.get('pending', 0),
+                'running': counts.get('running', 0),
+                'done': counts.get('done', 0),
+                'failed': counts.get('failed', 0),
+                'depth': counts.get('pending', 0) + counts.get('running', 0),
+                'oldest_pending': now - oldest if oldest else 0.0,
+                'latency': latency or 0.0}
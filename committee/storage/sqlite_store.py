@@ -0,0 +1,59 @@
+import os
+import sqlite3
+import threading
+
+from contextlib import contextmanager
+
+
+class SqliteStore:
+    """
+    Base class for the local SQLite stores.
+
+    One connection is shared by all threads of the process (guarded by
+    a lock), other processes can use the same file at the same time.
+    Tables from the schema are created when the store is opened.
+    Stores use WAL journal, which only works for processes of one host
+    (it needs memory shared between them).
+    """
+    schema = ''
+    journal_mode = 'WAL'
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, timeout=30,
+                                          check_same_thread=False,
+                                          isolation_level=None)
+        self.connection.execute(f'PRAGMA journal_mode={self.journal_mode}')
+        self.connection.executescript(self.schema)
+
+    def execute(self, sql, params=()):
+        """
+        Executes single statement and returns all rows.
+        """
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the statements of the block in one (write) transaction.
+        """
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    def close(self):
+        """
+        Closes the connection.
+        """
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,43 @@
+import time
+
+from committee.storage.sqlite_store import SqliteStore
+
+
+class StateStore(SqliteStore):
+    """
+    Persistent state of incremental checking.
+
+    For every repository, ref, context and filter (author, path) it keeps
+    the high-water mark, the newest commit of the last fully checked run.
+    """
+    schema = '''
+        CREATE TABLE IF NOT EXISTS marks (
+            reposlug TEXT NOT NULL,
+            ref TEXT NOT NULL,
+            context TEXT NOT NULL,
+            author TEXT NOT NULL,
+            path TEXT NOT NULL,
+            sha TEXT NOT NULL,
+            updated REAL NOT NULL,
+            PRIMARY KEY (reposlug, ref, context, author, path)
+        );
+    '''
+
+    def get_mark(self, reposlug, ref, context, author, path):
+        """
+        Returns the last fully checked SHA or None.
+        """
+        rows = self.execute('SELECT sha FROM marks WHERE reposlug = ? AND '
+                            'ref = ? AND context = ? AND author = ? AND '
+                            'path = ?', (reposlug, ref or '', context,
+                                         author or '', path or ''))
+        return rows[0][0] if rows else None
+
+    def set_mark(self, reposlug, ref, context, author, path, sha):
+        """
+        Stores the newest fully checked SHA.
+        """
+        self.execute('INSERT OR REPLACE INTO marks (reposlug, ref, context, '
+                     'author, path, sha, updated) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     (reposlug, ref or '', context, author or '', path or '',
+                      sha, time.time()))
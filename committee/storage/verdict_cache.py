@@ -0,0 +1,40 @@
+from committee.storage.blob_cache import BlobCache
+
+
+class VerdictCache(BlobCache):
+    """
+    Persistent verdicts of rules over commits.
+
+    Every verdict (whether the rule was violated and its printed output)
+    is keyed by the commit SHA and the fingerprint of the rule, which
+    covers the rule definition and wordlist contents. Changing a rule
+    only makes its own verdicts unreachable (they are evicted later),
+    verdicts of the other rules are still used.
+    """
+    table = 'verdicts'
+
+    def key(self, sha, rule):
+        """
+        Returns the cache key of the verdict.
+        """
+        return f'{sha} {rule.fingerprint}'
+
+    def lookup(self, sha, rules, with_output):
+        """
+        Returns known verdicts of the rules as a dictionary, verdicts
+        without output are not usable when the output is needed.
+        """
+        keys = {self.key(sha, rule): rule for rule in rules}
+        verdicts = {}
+        for key, (violated, output) in self.get_many(keys).items():
+            if with_output and output is None:
+                continue
+            verdicts[keys[key]] = (violated, output)
+        return verdicts
+
+    def store(self, sha, verdicts):
+        """
+        Stores the verdicts of the rules.
+        """
+        self.put_many({self.key(sha, rule): verdict
+                       for rule, verdict in verdicts.items()})
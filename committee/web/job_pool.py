@@ -0,0 +1,109 @@
+import sys
+import threading
+
+
+class JobPool:
+    """
+    Background workers draining the webhook job queue.
+
+    Each worker claims a batch of waiting commits, groups them by
+    repository, config and target url and hands every group to the runner
+    (which checks the commits and sets their statuses). Workers are started
+    with the server (so jobs left from the previous run are not stuck
+    until the next push) and sleep while the queue is empty.
+    """
+    def __init__(self, queue, runner, workers=2, batch_size=20,
+                 lease_time=600, idle_wait=5):
+        self.queue = queue
+        self.runner = runner
+        self.workers = workers
+        self.batch_size = batch_size
+        self.lease_time = lease_time
+        self.idle_wait = idle_wait
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.threads = []
+        self.processed = 0
+        self.failed = 0
+
+    def start(self):
+        """
+        Starts the worker threads (only once).
+        """
+        with self.lock:
+            if self.threads:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self.work, daemon=True,
+                                          name=f'committee-worker-{number}')
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, reposlug, config, target_url, commits):
+        """
+        Enqueues the commits and wakes up the workers,
+        returns numbers of queued and coalesced commits.
+        """
+        queued, coalesced = self.queue.enqueue(reposlug, config, target_url,
+                                               commits)
+        self.start()
+        self.wakeup.set()
+        return queued, coalesced
+
+    def work(self):
+        """
+        Worker loop, runs until the pool is stopped.
+        """
+        while not self.stopping.is_set():
+            jobs = self.queue.claim(self.batch_size, self.lease_time)
+            if not jobs:
+                self.wakeup.wait(self.idle_wait)
+                self.wakeup.clear()
+                continue
+            groups = {}
+            for job in jobs:
+                key = (job['reposlug'], job['config'], job['target_url'])
+                groups.setdefault(key, []).append(job)
+            for (reposlug, config, target_url), group in groups.items():
+                self.run(reposlug, config, target_url, group)
+
+    def run(self, reposlug, config, target_url, jobs):
+        """
+        Runs one group of jobs and records the result in the queue.
+        """
+        shas = [job['sha'] for job in jobs]
+        try:
+            self.runner(reposlug, config, target_url,
+                        [job['commit'] for job in jobs])
+        except BaseException as error:
+            print(f'Job of {len(shas)} commits in {reposlug} failed: '
+                  f'{error!r}', file=sys.stderr)
+            self.queue.finish(shas, failed=True)
+            with self.lock:
+                self.failed += len(shas)
+            return
+        self.queue.finish(shas)
+        with self.lock:
+            self.processed += len(shas)
+
+    def stats(self):
+        """
+        Returns queue depth and latency together with worker numbers.
+        """
+        stats = self.queue.stats()
+        with self.lock:
+            stats.update({'workers': len(self.threads),
+                          'processed': self.processed,
+                          'failed_runs': self.failed})
+        return stats
+
+    def stop(self, timeout=None):
+        """
+        Stops the workers after their current batch,
+        unfinished jobs stay in the queue.
+        """
+        self.stopping.set()
+        self.wakeup.set()
+        for thread in self.threads:
+            thread.join(timeout)
@@ -1,6 +1,11 @@
-import requests
+import hashlib
+import threading
+import time
 
-from flask import render_template
+from flask import render_template, request, make_response
+from flask import current_app, stream_with_context, Response
+from committee.git_session import GitSession
+from committee.web.wordlist_index import file_signature
 
 
 def internal_error(reason):
@@ -10,16 +15,134 @@ def internal_error(reason):
     return 'Internal Server Error: ' + reason, 500
 
 
-def get_main(config, git_token):
+def fetch_username(git_token, adapter=None):
+    """
+    Auth with Github and returns the user's login (None if it failed).
+    """
+    with GitSession(git_token, adapter=adapter) as git_session:
+        req = git_session.get("https://api.github.com/user")
+        if not req.ok:
+            return None
+        return req.json().get('login')
+
+
+class Dashboard:
+    """
+    Cached render of the index page.
+
+    The page is rendered again only when the config changes, the login
+    changes or the render is older than ttl seconds. The login is fetched
+    from Github in a background thread (again once it is older than ttl),
+    the page never waits for it, until it arrives the login is unknown.
+    """
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.logins = {}
+        self.fetching = set()
+        self.rendered = None
+
+    def username(self, git_token, adapter=None):
+        """
+        Returns the known login of the token, refreshes it
+        in background when it is missing or old.
+        """
+        key = hashlib.sha256(git_token.encode()).hexdigest()
+        with self.lock:
+            login, fetched = self.logins.get(key, (None, 0))
+            if time.time() - fetched >= self.ttl and key not in self.fetching:
+                self.fetching.add(key)
+                threading.Thread(target=self.refresh, daemon=True,
+                                 args=(key, git_token, adapter)).start()
+        return login
+
+    def refresh(self, key, git_token, adapter):
+        """
+        Fetches the login (runs in background thread).
+        """
+        try:
+            login = fetch_username(git_token, adapter)
+        except Exception:
+            login = None
+        with self.lock:
+            old_login = self.logins.get(key, (None, 0))[0]
+            self.logins[key] = (login or old_login, time.time())
+            self.fetching.discard(key)
+
+    def render(self, loaded_config, adapter=None):
+        """
+        Returns the rendered page and its ETag.
+        """
+        username = self.username(loaded_config.git_token, adapter)
+        with self.lock:
+            if self.rendered is not None:
+                cache_key, html, etag, rendered = self.rendered
+                if cache_key == (loaded_config, username) and \
+                        time.time() - rendered < self.ttl:
+                    return html, etag
+        html = render_template('index.html',
+                               config=loaded_config.sections.items(),
+                               username=username or 'unknown')
+        etag = hashlib.sha1(html.encode()).hexdigest()
+        with self.lock:
+            self.rendered = ((loaded_config, username), html, etag,
+                             time.time())
+        return html, etag
+
+
+def get_main(dashboard, loaded_config, adapter=None):
     """
     Handles the index page of the website app.
 
-    Auth with Github, grabs the user's login and renders the template.
+    Serves the cached render, answers 304 Not Modified when
+    the client already has it.
+    """
+    html, etag = dashboard.render(loaded_config, adapter)
+    response = make_response(html)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+def get_wordlist(indexes, path):
+    """
+    Handles the wordlist page, the lines are streamed.
+
+    Without page argument all lines are shown, otherwise one page 
+    (per_page lines, 1000 by default). With prefix argument only lines 
+    starting with it are shown (sorted). Pages are cached by ETag 
+    derived from the file's inode, mtime and size.
     """
-    with requests.Session() as git_session:
-        auth = {'Authorization': f'token {git_token}'}
-        git_session.headers.update(auth)
-        req = git_session.get("https://api.github.com/user").json()
-        username = req['login']
-    return render_template('index.html',
-                           config=config.items(), username=username)
+    try:
+        signature = file_signature(path)
+    except OSError:
+        return internal_error('Word list does not exist.')
+    prefix = request.args.get('prefix', '')
+    page = request.args.get('page', type=int)
+    per_page = min(max(request.args.get('per_page', 1000, type=int), 1),
+                   10000)
+    etag = hashlib.sha1(repr((signature, prefix, page, per_page))
+                        .encode()).hexdigest()
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+    try:
+        index = indexes.get(path, signature)
+    except OSError:
+        return internal_error('Word list does not exist.')
+    if page is None:
+        numbers, total = index.select(prefix)
+        pages = None
+    else:
+        page = max(page, 1)
+        numbers, total = index.select(prefix, (page - 1) * per_page,
+                                      page * per_page)
+        pages = max((total + per_page - 1) // per_page, 1)
+    template = current_app.jinja_env.get_template('wordlists.html')
+    lines = (index.line(number) for number in numbers)
+    response = Response(stream_with_context(template.generate(
+        lines=lines, prefix=prefix, page=page, pages=pages,
+        per_page=per_page, total=total)))
+    response.set_etag(etag)
+    return response
@@ -0,0 +1,107 @@
+import os
+import threading
+from array import array
+
+
+def file_signature(path):
+    """
+    Returns inode, mtime and size of the file (raises OSError if missing).
+    """
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class WordlistIndex:
+    """
+    Wordlist file loaded once with an index of its lines.
+
+    Lines are kept as offsets into the file contents, both in file order
+    (for paging) and sorted by lowercased text (for prefix search),
+    so a page or a search only decodes the lines it looks at.
+    """
+    def __init__(self, path):
+        self.signature = file_signature(path)
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        self.starts = array('L', [0])
+        position = self.data.find(b'\n')
+        while position != -1:
+            self.starts.append(position + 1)
+            position = self.data.find(b'\n', position + 1)
+        if self.starts[-1] != len(self.data):
+            self.starts.append(len(self.data))
+        self.order = array('L', sorted(range(len(self)), key=self.key))
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def raw(self, number):
+        """
+        Returns the line (without line ending) as bytes.
+        """
+        line = self.data[self.starts[number]:self.starts[number + 1]]
+        return line.rstrip(b'\r\n')
+
+    def key(self, number):
+        """
+        Returns the sort key of the line (decoded first, so non-ASCII
+        letters are lowercased too).
+        """
+        return self.line(number).lower()
+
+    def line(self, number):
+        """
+        Returns the decoded line.
+        """
+        return self.raw(number).decode('utf-8', errors='replace')
+
+    def bound(self, prefix, inclusive):
+        """
+        Binary search in sorted lines, returns position of the first line
+        whose prefix is greater (or equal when not inclusive) than prefix.
+        """
+        low, high = 0, len(self.order)
+        while low < high:
+            middle = (low + high) // 2
+            head = self.key(self.order[middle])[:len(prefix)]
+            if head < prefix or (inclusive and head == prefix):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def select(self, prefix='', start=0, stop=None):
+        """
+        Returns numbers of lines starting with prefix (case insensitive,
+        sorted) or of all lines (in file order), sliced by start and stop,
+        together with the number of all matching lines.
+        """
+        if prefix:
+            prefix = prefix.lower()
+            first = self.bound(prefix, False)
+            last = self.bound(prefix, True)
+            numbers = self.order[first:last]
+        else:
+            numbers = range(len(self))
+        return numbers[start:stop], len(numbers)
+
+
+class WordlistIndexes:
+    """
+    Indexes of wordlists kept in memory, an index is built again
+    when its file changes.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.indexes = {}
+
+    def get(self, path, signature):
+        """
+        Returns index of the wordlist with the given file signature.
+        """
+        with self.lock:
+            index = self.indexes.get(path)
+            if index is None or index.signature != signature:
+                index = WordlistIndex(path)
+                self.indexes[path] = index
+            return index
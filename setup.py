@@ -14,7 +14,8 @@ setup(
     license='MIT License',
     url='https://github.com/fitancinpet/committee',
     packages=find_packages(include=['committee', 'committee.*']),
-    install_requires=['Flask', 'click>=6', 'requests'],
+    install_requires=['Flask', 'click>=6', 'requests',
+                      'contextvars; python_version < "3.7"'],
     python_requires='>=3.6',
     classifiers=[
         'Intended Audience :: Developers',
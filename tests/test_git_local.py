@@ -0,0 +1,63 @@
+import shutil
+import subprocess
+
+import pytest
+
+from committee.git_local import parse_record, local_commits
+
+
+def test_parse_record_rename_and_binary():
+    record = ('abc123\x1fMove things\n\x1f\n'
+              ':100644 100644 1111111 2222222 R090\0old.py\0new.py\0'
+              ':100644 100644 3333333 4444444 M\0logo.png\0'
+              '\0'
+              '2\t1\t\0old.py\0new.py\0'
+              '-\t-\tlogo.png\0')
+    commit = parse_record(record)
+    assert commit['sha'] == 'abc123'
+    assert commit['commit']['message'] == 'Move things'
+    files = {entry['filename']: entry for entry in commit['files']}
+    assert files['new.py']['status'] == 'renamed'
+    assert files['new.py']['previous_filename'] == 'old.py'
+    assert files['new.py']['additions'] == 2
+    assert files['new.py']['deletions'] == 1
+    assert files['logo.png']['status'] == 'modified'
+    assert files['logo.png']['changes'] == 0
+    assert commit['stats'] == {'additions': 2, 'deletions': 1, 'total': 3}
+
+
+def git(repo, *args):
+    subprocess.run(['git', '-C', str(repo), '-c', 'user.name=Tester',
+                    '-c', 'user.email=tester@example.com', *args],
+                   check=True, stdout=subprocess.DEVNULL)
+
+
+@pytest.mark.skipif(shutil.which('git') is None, reason='git is missing')
+def test_local_commits_path_keeps_all_files(tmp_path):
+    git(tmp_path, 'init', '-q')
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'README').write_text('hello\n')
+    (tmp_path / 'src' / 'a.py').write_text('a = 1\n')
+    git(tmp_path, 'add', '.')
+    git(tmp_path, 'commit', '-q', '-m', 'First')
+    (tmp_path / 'README').write_text('hello\nworld\n')
+    (tmp_path / 'src' / 'a.py').write_text('a = 2\n')
+    (tmp_path / 'data.bin').write_bytes(b'\0\1\2')
+    git(tmp_path, 'add', '.')
+    git(tmp_path, 'commit', '-q', '-m', 'Second')
+    git(tmp_path, 'mv', 'README', 'README.txt')
+    git(tmp_path, 'commit', '-q', '-m', 'Rename')
+
+    commits = list(local_commits(str(tmp_path), None, 'src', None))
+    assert [c['commit']['message'] for c in commits] == ['Second', 'First']
+    second = {entry['filename']: entry for entry in commits[0]['files']}
+    assert set(second) == {'README', 'src/a.py', 'data.bin'}
+    assert second['data.bin']['changes'] == 0
+    assert commits[0]['stats'] == {'additions': 2, 'deletions': 1,
+                                   'total': 3}
+
+    renamed = list(local_commits(str(tmp_path), None, None, None))[0]
+    assert renamed['files'] == [{'status': 'renamed', 'additions': 0,
+                                 'deletions': 0, 'changes': 0,
+                                 'previous_filename': 'README',
+                                 'filename': 'README.txt'}]